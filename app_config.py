@@ -0,0 +1,408 @@
+"""
+Jediné místo, kde se parsuje config.json.
+
+get_config() vrací neměnný AppConfig a drží ho v cache. Soubor se znovu
+načte jen tehdy, když se změní jeho mtime/velikost (stat max. jednou za
+CHECK_INTERVAL_SECONDS), takže volání na hot paths nic neparsují.
+
+Změny configu (plán rotace, LOG_LEVEL, seznam targetů) se tak projeví bez
+restartu služby; kdo potřebuje reagovat okamžitě, zaregistruje si callback
+přes on_change() a spustí watcher přes start_watching().
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from types import MappingProxyType
+from typing import IO, Any, Callable, Iterator, Mapping
+
+BASE_DIR = Path(__file__).resolve().parent
+CONFIG_PATH = BASE_DIR / "config.json"
+
+# soubory s tajemstvími (staged PSK, klíč historie, outbox) – mimo data/,
+# které servíruje status_server.py
+PRIVATE_DIR = BASE_DIR / "private"
+
+CHECK_INTERVAL_SECONDS = 1.0
+
+DEFAULT_BACKEND_PORT = 8081
+
+LOG_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "WARN": logging.WARNING,  # alias, který logging.getLevelName() také zná
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+
+logger = logging.getLogger("psk_config")
+
+
+def private_path(name: str, legacy: Path | None = None) -> Path:
+    """
+    Cesta v PRIVATE_DIR. Soubor / adresář ze starého umístění (legacy,
+    typicky v data/) se při prvním použití přesune, u SQLite i s -wal/-shm.
+    """
+    PRIVATE_DIR.mkdir(exist_ok=True)
+    path = PRIVATE_DIR / name
+    if legacy is not None and legacy.exists() and not path.exists():
+        for suffix in ("", "-wal", "-shm"):
+            old = legacy.with_name(legacy.name + suffix)
+            if old.exists():
+                os.replace(old, path.with_name(path.name + suffix))
+        logger.info("Moved %s to %s", legacy, path)
+    return path
+
+
+@contextmanager
+def open_atomic(path: Path) -> Iterator[IO[bytes]]:
+    """
+    Binární zápis přes vlastní tmp soubor ve stejném adresáři + os.replace –
+    čtenář nikdy nevidí rozepsaný soubor a souběžní zapisovatelé (vlákna,
+    procesy, nody na sdíleném disku) si tmp nepřepíšou. Při chybě se tmp
+    smaže a cíl zůstane beze změny.
+    """
+    path = Path(path)
+    f = tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False)
+    try:
+        with f:
+            yield f
+        os.replace(f.name, path)
+    except BaseException:
+        Path(f.name).unlink(missing_ok=True)
+        raise
+
+
+def write_atomic(path: Path, data: bytes | str):
+    with open_atomic(path) as f:
+        f.write(data.encode("utf-8") if isinstance(data, str) else data)
+
+
+class ConfigError(RuntimeError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Config objekty
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Target:
+    """
+    Jeden rotovaný SSID profil na konkrétní lokaci / node daného WM.
+    """
+
+    ssid_profile_name: str
+    location_id: int
+    node_id: int
+    base_url: str
+    # jen publikované targety zapisují data/current_psk.json pro web UI
+    publish: bool = True
+
+    @property
+    def key(self) -> str:
+        return f"{self.base_url}|{self.location_id}|{self.node_id}|{self.ssid_profile_name}"
+
+
+@dataclass(frozen=True, eq=False)
+class AppConfig:
+    path: Path
+    mtime_ns: int
+    raw: Mapping[str, Any]
+    log_level: int
+    backend_port: int
+    verify_ssl: bool
+    # ("interval", timedelta) nebo ("daily", (hour, minute))
+    schedule: tuple[str, Any]
+    targets: tuple[Target, ...] = field(default_factory=tuple)
+    # chyby targetů / plánu z parse_config(strict=False) – týkají se jen rotátoru
+    errors: tuple[str, ...] = ()
+
+    # dict-like přístup – starší kód pracuje s configem jako s dictem
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.raw.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.raw[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.raw
+
+    @property
+    def schedule_interval(self) -> timedelta:
+        """
+        Nejdelší povolená doba mezi dvěma rotacemi podle plánu.
+        """
+        mode, value = self.schedule
+        return value if mode == "interval" else timedelta(days=1)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _int(key: str, raw: Any, lo: int | None = None, hi: int | None = None) -> int:
+    try:
+        value = int(raw)
+    except (TypeError, ValueError) as e:
+        raise ConfigError(f"{key} must be an integer, got {raw!r}") from e
+    if (lo is not None and value < lo) or (hi is not None and value > hi):
+        raise ConfigError(f"{key}={value} is out of range [{lo}, {hi}]")
+    return value
+
+
+def _parse_schedule(cfg: Mapping) -> tuple[str, Any]:
+    # TEST MODE – TEST_ROTATION_EVERY_MINUTES
+    interval_minutes = _int(
+        "TEST_ROTATION_EVERY_MINUTES", cfg.get("TEST_ROTATION_EVERY_MINUTES") or 0, lo=0
+    )
+    if interval_minutes > 0:
+        return "interval", timedelta(minutes=interval_minutes)
+
+    # STANDARD MODE – daily time
+    hour = _int("ROTATION_HOUR", cfg.get("ROTATION_HOUR", 2), 0, 23)
+    minute = _int("ROTATION_MINUTE", cfg.get("ROTATION_MINUTE", 0), 0, 59)
+    return "daily", (hour, minute)
+
+
+def parse_target(entry: Mapping, defaults: Mapping, publish_default: bool = False) -> Target:
+    def pick(key: str):
+        return entry.get(key, defaults.get(key))
+
+    name = pick("SSID_PROFILE_NAME")
+    base_url = pick("WM_BASE_URL")
+    if not name:
+        raise ConfigError("SSID_PROFILE_NAME is missing in target definition")
+    if not base_url:
+        raise ConfigError(f"WM_BASE_URL is missing for target '{name}'")
+
+    # on-prem: location id je dáno přímo v configu
+    if pick("WM_LOCATION_ID") is None:
+        raise ConfigError(
+            "WM_LOCATION_ID is missing in config.json "
+            "(on-prem mode requires explicit location id)."
+        )
+
+    return Target(
+        ssid_profile_name=str(name),
+        location_id=_int("WM_LOCATION_ID", pick("WM_LOCATION_ID")),
+        node_id=_int("WM_NODE_ID", pick("WM_NODE_ID") or 0),
+        base_url=str(base_url).rstrip("/"),
+        publish=bool(entry.get("PUBLISH", publish_default)),
+    )
+
+
+def _parse_targets(cfg: Mapping) -> tuple[Target, ...]:
+    """
+    TARGETS: [{"SSID_PROFILE_NAME": ..., "WM_LOCATION_ID": ..., "WM_NODE_ID": ...,
+               "WM_BASE_URL": ..., "PUBLISH": false}, ...]
+    Chybějící klíče se berou z top-level configu. Bez TARGETS se rotuje
+    jeden target z top-level SSID_PROFILE_NAME / WM_LOCATION_ID / WM_NODE_ID.
+    """
+    entries = cfg.get("TARGETS")
+    if entries is None:
+        if not cfg.get("SSID_PROFILE_NAME"):
+            return ()
+        return (parse_target({}, cfg, publish_default=True),)
+
+    if not isinstance(entries, (list, tuple)):
+        raise ConfigError("TARGETS must be a list of objects")
+
+    targets = tuple(parse_target(e, cfg, publish_default=False) for e in entries)
+    keys = [t.key for t in targets]
+    if len(set(keys)) != len(keys):
+        raise ConfigError("TARGETS contains duplicate entries")
+    return targets
+
+
+def parse_config(
+    data: Mapping, path: Path = CONFIG_PATH, mtime_ns: int = 0, strict: bool = True
+) -> AppConfig:
+    """
+    strict=False: chybné TARGETS / plán se nevyhodí, ale zapíšou do
+    AppConfig.errors (targets prázdné, plán denní default) – web server
+    potřebuje jen port, LOG_LEVEL a REPLICATION_SECRET.
+    """
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path} must contain a JSON object")
+
+    level_name = str(data.get("LOG_LEVEL", "INFO")).strip().upper()
+    if level_name not in LOG_LEVELS:
+        # překlep v úrovni logování nesmí zastavit rotace
+        logger.warning("Unknown LOG_LEVEL '%s' in %s, using INFO", level_name, path)
+        level_name = "INFO"
+
+    raw = _freeze(data)
+    errors: list[str] = []
+
+    def rotator_only(parse: Callable[[Mapping], Any], default: Any) -> Any:
+        try:
+            return parse(raw)
+        except ConfigError as e:
+            if strict:
+                raise
+            errors.append(str(e))
+            return default
+
+    return AppConfig(
+        path=path,
+        mtime_ns=mtime_ns,
+        raw=raw,
+        log_level=LOG_LEVELS[level_name],
+        backend_port=_int("BACKEND_PORT", raw.get("BACKEND_PORT", DEFAULT_BACKEND_PORT), 1, 65535),
+        verify_ssl=bool(raw.get("VERIFY_SSL", True)),
+        schedule=rotator_only(_parse_schedule, ("daily", (2, 0))),
+        targets=rotator_only(_parse_targets, ()),
+        errors=tuple(errors),
+    )
+
+
+def read_config(path: Path = CONFIG_PATH, strict: bool = True) -> AppConfig:
+    if not path.is_file():
+        raise FileNotFoundError(f"Config file {path} missing")
+
+    st = path.stat()
+    with path.open("r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"Invalid JSON in {path}: {e}") from e
+    return parse_config(data, path, st.st_mtime_ns, strict)
+
+
+# ---------------------------------------------------------------------------
+# Cache + hot reload
+# ---------------------------------------------------------------------------
+
+_lock = threading.Lock()
+# poslední platný config (rotátor) a poslední načtený, i s AppConfig.errors (web)
+_cached: AppConfig | None = None
+_latest: AppConfig | None = None
+_cached_stamp: tuple[int, int] | None = None
+_last_check = 0.0
+_callbacks: list[tuple[Callable[[AppConfig], None], bool]] = []
+_watcher: threading.Thread | None = None
+
+
+def _stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _pick(strict: bool) -> AppConfig:
+    if not strict:
+        return _latest
+    if _cached is None:
+        raise ConfigError(f"Invalid {_latest.path}: {'; '.join(_latest.errors)}")
+    return _cached
+
+
+def get_config(force_check: bool = False, strict: bool = True) -> AppConfig:
+    """
+    Vrátí aktuální config z cache. Pokud se soubor mezitím změnil, načte
+    ho znovu; nevalidní nová verze se zaloguje a zůstane platná předchozí.
+
+    strict=False (web server) vrací i config s chybnými targety / plánem
+    (viz AppConfig.errors) – ty rotátor odmítne, port, LOG_LEVEL
+    a REPLICATION_SECRET ale platí.
+    """
+    global _cached, _latest, _cached_stamp, _last_check
+
+    now = time.monotonic()
+    if _latest is not None and not force_check and now - _last_check < CHECK_INTERVAL_SECONDS:
+        return _pick(strict)
+
+    changed: list[tuple[AppConfig, bool]] = []
+    with _lock:
+        _last_check = now
+        stamp = _stamp(CONFIG_PATH)
+        if _latest is not None and stamp == _cached_stamp:
+            return _pick(strict)
+
+        try:
+            cfg = read_config(CONFIG_PATH, strict=False)
+        except Exception as e:
+            if _latest is None:
+                raise
+            if stamp != _cached_stamp:
+                logger.error("Config reload failed, keeping previous config: %s", e)
+                _cached_stamp = stamp
+            return _pick(strict)
+
+        if _latest is not None:
+            logger.info("Config %s changed, reloaded", CONFIG_PATH)
+            changed.append((cfg, False))
+        _latest, _cached_stamp = cfg, stamp
+
+        if cfg.errors:
+            logger.error(
+                "Config %s is invalid for rotation%s: %s",
+                CONFIG_PATH,
+                ", keeping previous targets and schedule" if _cached is not None else "",
+                "; ".join(cfg.errors),
+            )
+        else:
+            if _cached is not None:
+                changed.append((cfg, True))
+            _cached = cfg
+
+        result = _pick(strict)
+
+    for cfg, strict_change in changed:
+        for callback, strict_callback in list(_callbacks):
+            if strict_callback != strict_change:
+                continue
+            try:
+                callback(cfg)
+            except Exception as e:
+                logger.exception("Config change callback failed: %s", e)
+    return result
+
+
+def on_change(callback: Callable[[AppConfig], None], strict: bool = True):
+    """
+    strict=False: callback dostane i config s chybnými targety / plánem.
+    """
+    _callbacks.append((callback, strict))
+
+
+def start_watching(interval: float = 2.0):
+    """
+    Spustí daemon vlákno, které config pravidelně kontroluje a při změně
+    zavolá callbacky z on_change().
+    """
+    global _watcher
+    if _watcher is not None and _watcher.is_alive():
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                get_config(force_check=True, strict=False)
+            except Exception:
+                pass
+
+    _watcher = threading.Thread(target=loop, name="config-watcher", daemon=True)
+    _watcher.start()
+
+
+def apply_log_level(cfg: AppConfig):
+    # callback pro on_change – LOG_LEVEL se projeví bez restartu
+    logging.getLogger().setLevel(cfg.log_level)
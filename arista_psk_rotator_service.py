@@ -7,7 +7,21 @@ import sys
 from pathlib import Path
 from datetime import datetime, timedelta
 
-from rotate_psk import BASE_DIR, rotate_once, load_config  # používáme registry inside rotate_once()
+from app_config import on_change, start_watching
+from leader import coordinator_from_config, next_interval_slot, schedule_cycle
+from notify import get_dispatcher
+from replication import get_retrier
+from rotation_outbox import fail_intent, get_drainer
+from rotate_psk import (  # credentials se čtou uvnitř rotate_once()
+    BASE_DIR,
+    load_config,
+    prepare_all,
+    prestage_targets,
+    replay_rotation,
+    rotate_once,
+    rotate_targets,
+    stage_targets,
+)
 
 LOGS_DIR = BASE_DIR / "logs"
 LOGS_DIR.mkdir(exist_ok=True)
@@ -50,25 +64,32 @@ def get_schedule_from_config():
         logger.error("Cannot load config.json, using fallback daily at 02:00: %s", e)
         return "daily", (2, 0)
 
-    # TEST MODE – TEST_ROTATION_EVERY_MINUTES
-    interval_minutes = int(cfg.get("TEST_ROTATION_EVERY_MINUTES", 0) or 0)
-    if interval_minutes > 0:
-        logger.info("Using test rotation interval every %s minutes", interval_minutes)
-        return "interval", timedelta(minutes=interval_minutes)
+    mode, value = cfg.schedule
+    if mode == "interval":
+        logger.info("Using test rotation interval every %s minutes", int(value.total_seconds() // 60))
+    else:
+        logger.info("Using daily rotation at %02d:%02d", *value)
+    return mode, value
 
-    # STANDARD MODE – daily time
-    hour = int(cfg.get("ROTATION_HOUR", 2))
-    minute = int(cfg.get("ROTATION_MINUTE", 0))
 
-    logger.info("Using daily rotation at %02d:%02d", hour, minute)
-    return "daily", (hour, minute)
+def get_prestage_lead_from_config() -> timedelta:
+    """
+    Jak dlouho před plánovaným časem se má připravit session a profil
+    (PRESTAGE_LEAD_SECONDS, default 60 s, 0 = vypnuto).
+    """
+    try:
+        cfg = load_config()
+    except Exception:
+        return timedelta(seconds=60)
+    return timedelta(seconds=max(0, int(cfg.get("PRESTAGE_LEAD_SECONDS", 60))))
 
 
 def compute_next_run(mode, value, from_time=None):
     now = from_time or datetime.now()
 
     if mode == "interval":
-        return now + value
+        # zarovnáno na epochu – stejný termín (a cycle id) na všech nodech
+        return next_interval_slot(value, now)
 
     hour, minute = value
     target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
@@ -111,20 +132,91 @@ class AristaPskRotateService(win32serviceutil.ServiceFramework):
 
     def main(self):
         mode, value = get_schedule_from_config()
+        lead = get_prestage_lead_from_config()
         next_run = compute_next_run(mode, value)
+        prepared = None
+
+        # změny config.json (plán, LOG_LEVEL, targety) se projeví bez restartu
+        self.config_changed = False
+        on_change(self.on_config_change)
+        start_watching()
+
+        # HA: víc nodů → lease + rozdělení targetů (LEASE_BACKEND)
+        self.coordinator = None
+        try:
+            self.coordinator = coordinator_from_config(load_config())
+        except Exception as e:
+            logger.error("Cannot set up lease coordination, running standalone: %s", e)
+        if self.coordinator is not None:
+            self.coordinator.start_heartbeat()
+            logger.info("Lease coordination enabled, node_id=%s", self.coordinator.node_id)
 
         logger.info(
             "Service loop starting — mode=%s, next_run=%s",
             mode,
             next_run.isoformat(),
         )
+        self.stage_next()
+
+        # doručit notifikace, které zůstaly v outboxu z minula
+        try:
+            get_dispatcher(load_config())
+        except Exception as e:
+            logger.error("Cannot start notification dispatcher: %s", e)
+
+        # web nody, na které se nepovedl push stavu, se dorovnají na pozadí
+        try:
+            get_retrier().start()
+        except Exception as e:
+            logger.error("Cannot start state push retrier: %s", e)
+
+        # rotace, které neprošly kvůli výpadku WM, se opakují na pozadí
+        drainer = None
+        try:
+            drainer = get_drainer(load_config(), self.replay_queued)
+            if drainer is not None:
+                drainer.start()
+        except Exception as e:
+            logger.error("Cannot start rotation outbox drainer: %s", e)
 
         while self.is_running:
+            if self.config_changed:
+                self.config_changed = False
+                new_schedule = get_schedule_from_config()
+                lead = get_prestage_lead_from_config()
+                if new_schedule != (mode, value):
+                    mode, value = new_schedule
+                    next_run = compute_next_run(mode, value)
+                    logger.info("Schedule changed, next rotation planned at %s", next_run.isoformat())
+                if prepared is not None:
+                    # targety se mohly změnit – připravit znovu
+                    for p in prepared.values():
+                        p.close()
+                    prepared = None
+                self.stage_next()
+
             now = datetime.now()
 
+            # pre-staging: login + načtení profilu chvíli před plánovaným časem,
+            # v plánovaný čas už jen PUT + publish
+            if prepared is None and lead and now >= next_run - lead and now < next_run:
+                try:
+                    cfg = load_config()
+                    prepared = prepare_all(cfg, prestage_targets(cfg, self.my_targets()))
+                except Exception as e:
+                    logger.error("Rotation pre-staging failed: %s", e)
+                    prepared = {}
+                logger.info("Rotation prepared, cutover at %s", next_run.isoformat())
+
             if now >= next_run:
                 logger.info("Starting scheduled PSK rotation…")
-                ok = rotate_once()
+                try:
+                    ok = self.run_rotation(schedule_cycle(mode, value, next_run), prepared)
+                except Exception as e:
+                    # jeden nepovedený cyklus nesmí zastavit službu
+                    logger.exception("PSK rotation crashed: %s", e)
+                    ok = False
+                prepared = None
 
                 if not ok:
                     logger.error("PSK rotation FAILED — see rotate.log")
@@ -133,16 +225,113 @@ class AristaPskRotateService(win32serviceutil.ServiceFramework):
 
                 next_run = compute_next_run(mode, value, from_time=datetime.now())
                 logger.info("Next rotation planned at %s", next_run.isoformat())
+                self.stage_next()
 
             # Sleep at most 60 seconds to react to stop events
+            wake_at = next_run if prepared is not None or not lead else next_run - lead
+            if wake_at <= datetime.now():
+                wake_at = next_run
             wait_seconds = max(
-                1, min(60, int((next_run - datetime.now()).total_seconds()))
+                1, min(60, int((wake_at - datetime.now()).total_seconds()))
             )
             rc = win32event.WaitForSingleObject(self.stop_event, wait_seconds * 1000)
             if rc == win32event.WAIT_OBJECT_0:
                 logger.info("Service stop detected — exiting loop")
                 break
 
+        for p in (prepared or {}).values():
+            p.close()
+        if drainer is not None:
+            drainer.stop()
+        if self.coordinator is not None:
+            self.coordinator.stop()
+
+    def on_config_change(self, cfg):
+        self.config_changed = True
+
+    def wait(self, seconds: float) -> bool:
+        # False = přišel stop služby
+        rc = win32event.WaitForSingleObject(self.stop_event, int(seconds * 1000))
+        return rc != win32event.WAIT_OBJECT_0
+
+    def my_targets(self):
+        """
+        Targety tohoto nodu (při lease koordinaci), jinak všechny.
+        """
+        cfg = load_config()
+        if self.coordinator is None:
+            return cfg.targets
+        return self.coordinator.owned_targets(cfg.targets)
+
+    def run_rotation(self, cycle: str, prepared) -> bool:
+        if self.coordinator is None:
+            return rotate_once(prepared, self.wait)
+
+        cfg = load_config()
+        pending_prepared = [prepared]
+
+        def rotate(targets):
+            # předpřipravené session jen pro první dávku, pak už celé rotace
+            batch, pending_prepared[0] = pending_prepared[0], None
+            # lease se obnoví těsně před rotací – rollout po vlnách může trvat déle než TTL
+            return rotate_targets(cfg, targets, batch, self.wait, self.coordinator.acquire)
+
+        # cizí targety sledovat nejvýš půl intervalu – cyklus nesmí přesáhnout další termín
+        try:
+            results = self.coordinator.run_cycle(
+                cycle,
+                cfg.targets,
+                rotate,
+                self.wait,
+                max_wait=cfg.schedule_interval.total_seconds() / 2,
+            )
+        finally:
+            for p in (pending_prepared[0] or {}).values():
+                p.close()
+
+        logger.info(
+            "Cycle %s: rotated %s target(s) on this node, %s failed",
+            cycle,
+            len(results),
+            sum(1 for ok in results.values() if not ok),
+        )
+        return all(results.values())
+
+    def replay_queued(self, target, psk: str, intent_id: int) -> bool:
+        if self.coordinator is None:
+            return replay_rotation(target, psk, intent_id)
+
+        # s koordinací jen pod lease – target mezitím mohl převzít jiný node;
+        # cizí target rotuje jeho vlastník, záměr tohoto nodu se zahodí
+        cfg = load_config()
+        try:
+            owned = bool(self.coordinator.owned_targets([target]))
+        except Exception as e:
+            fail_intent(cfg, intent_id, f"cannot read live nodes: {e}")
+            return False
+        if not owned:
+            fail_intent(cfg, intent_id, "target belongs to another node", retry=False)
+            return False
+        if not self.coordinator.acquire(target):
+            fail_intent(cfg, intent_id, "target leased by another node", retry=False)
+            return False
+        ok = replay_rotation(target, psk, intent_id)
+        if not ok:
+            self.coordinator.release(target)
+        return ok
+
+    def stage_next(self):
+        # nové PSK + QR se připraví hned po rotaci, mimo kritickou cestu
+        try:
+            cfg = load_config()
+            targets = self.my_targets()
+        except Exception as e:
+            logger.error("Cannot stage next PSK (will be generated at cutover): %s", e)
+            return
+
+        # PSK pro celou dávku najednou – unikátní i mezi targety se stejným SSID
+        stage_targets(targets, cfg)
+
 
 # ---------------------------------------------------------------------------
 # Entry point for manual control
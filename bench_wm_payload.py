@@ -0,0 +1,340 @@
+"""
+Benchmark: plný vs. minimální PUT payload (WM_MINIMAL_PUT) proti lokálnímu
+mock WM.
+
+Mock WM běží v tomto procesu (http://127.0.0.1:<volný port>) a vrací SSID
+profily. PUT stejně jako WM profil nahradí celý (zachová jen serverem
+generovaná pole), takže pole chybějící v allow-listu se ztratí.
+Pro každý target se provede stejná cesta jako při rotaci – GET ssidprofiles,
+find_profile, update_profile_psk, PUT – jednou s celým profilem a jednou
+s payloadem z allow-listu. Provoz měří wm_metrics; po každém běhu se ověří,
+že na "WM" je nové PSK a že ostatní konfigurace profilu zůstala beze změny.
+
+Výchozí profily jsou SYNTETICKÉ: read-only pole mocku jsou tatáž
+PUT_READONLY_FIELDS, která minimální payload vynechává. Kontrola LOST tak
+ověřuje jen build_put_payload (nic nezahodí mimo PUT_READONLY_FIELDS), ne
+to, že seznam odpovídá skutečnému WM, a úspora bajtů platí pro mock
+profily. Reálná čísla dá --sample s odpovědí GET ssidprofiles zachycenou
+na vlastním WM (API verze 17); co WM doopravdy generuje sám, ověří jen
+rotace proti WM s VERIFY_CONVERGENCE a porovnání GET před / po.
+
+Použití:
+  py -3.12 bench_wm_payload.py --targets 500 --concurrency 16
+  py -3.12 bench_wm_payload.py --targets 500 --link-kbps 2000   # pomalejší linka k WM
+  py -3.12 bench_wm_payload.py --sample ssidprofiles_v17.json  # zachycený GET z WM
+
+Nic se nemění na skutečném WM ani v data/.
+"""
+
+import argparse
+import copy
+import json
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+import wm_metrics
+from rotate_psk import (
+    PUT_READONLY_FIELDS,
+    build_put_payload,
+    fetch_ssid_profiles,
+    find_profile,
+    login_to_wm,
+    put_profile,
+    update_profile_psk,
+)
+
+VERSION = "17"
+PROFILES_PER_NODE = 4
+DEVICES_PER_PROFILE = 40
+
+
+# ---------------------------------------------------------------------------
+# Mock WM
+# ---------------------------------------------------------------------------
+
+
+def _config_fields(profile: dict) -> dict:
+    # konfigurace profilu bez serverem generovaných polí a bez PSK
+    config = {k: v for k, v in profile.items() if k not in PUT_READONLY_FIELDS[VERSION]}
+    wireless = dict(config.get("wirelessProfile") or {})
+    wireless["securityMode"] = {
+        k: v for k, v in (wireless.get("securityMode") or {}).items() if k != "pskPassphrase"
+    }
+    return {**config, "wirelessProfile": wireless}
+
+
+def _mock_profile(location_id: int, node_id: int, name: str, index: int) -> dict:
+    return {
+        "id": location_id * 1000 + node_id * 10 + index,
+        "templateName": name,
+        "ssid": name,
+        "locationId": location_id,
+        "nodeId": node_id,
+        "enabled": True,
+        "wirelessProfile": {
+            "securityMode": {"type": "WPA2_PSK", "pskPassphrase": "initial-passphrase"},
+            "band": "DUAL",
+            "vlanId": 100 + index,
+            "broadcastSsid": True,
+        },
+        # read-only / serverem generovaná pole
+        "createdBy": "admin@example.local",
+        "createdAt": "2024-01-01T00:00:00Z",
+        "modifiedBy": "psk-rotator",
+        "modifiedAt": "2024-01-01T00:00:00Z",
+        "revision": 1,
+        "inheritedFrom": {"locationId": 0, "path": "/Global/Region/Site"},
+        "statistics": {
+            "clients": 37,
+            "rxBytes": 81234567,
+            "txBytes": 91234567,
+            "history": [{"hour": h, "clients": (h * 7) % 50} for h in range(24)],
+        },
+        "appliedDevices": [
+            {"mac": f"00:11:74:{location_id % 256:02x}:{index:02x}:{d:02x}", "model": "C-260", "status": "ACTIVE"}
+            for d in range(DEVICES_PER_PROFILE)
+        ],
+    }
+
+
+def _sample_profile(sample: dict, location_id: int, node_id: int, name: str, index: int) -> dict:
+    # zachycený profil z WM, jen s identitou a PSK daného targetu
+    profile = copy.deepcopy(sample)
+    profile.update(
+        id=location_id * 1000 + node_id * 10 + index,
+        templateName=name,
+        ssid=name,
+        locationId=location_id,
+        nodeId=node_id,
+    )
+    wireless = profile.setdefault("wirelessProfile", {})
+    wireless.setdefault("securityMode", {})["pskPassphrase"] = "initial-passphrase"
+    return profile
+
+
+def load_sample(path: Path) -> dict:
+    """
+    První profil z uložené odpovědi GET ssidprofiles (seznam nebo jeden objekt).
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not isinstance(data, dict):
+        raise SystemExit(f"{path} does not contain an SSID profile")
+    return data
+
+
+class MockWM:
+    def __init__(self, link_kbps: float = 0.0, sample: dict | None = None):
+        self.link_kbps = link_kbps
+        self.sample = sample
+        self.profiles: dict[tuple[int, int], list[dict]] = {}
+        self.by_id: dict[int, dict] = {}
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="mock-wm", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def make_profile(self, location_id: int, node_id: int, name: str, index: int) -> dict:
+        if self.sample is not None:
+            return _sample_profile(self.sample, location_id, node_id, name, index)
+        return _mock_profile(location_id, node_id, name, index)
+
+    def node_profiles(self, location_id: int, node_id: int) -> list[dict]:
+        key = (location_id, node_id)
+        with self._lock:
+            if key not in self.profiles:
+                plist = [
+                    self.make_profile(location_id, node_id, f"SITE{location_id}-{i}", i)
+                    for i in range(PROFILES_PER_NODE)
+                ]
+                self.profiles[key] = plist
+                self.by_id.update((p["id"], p) for p in plist)
+            return self.profiles[key]
+
+    def _link_delay(self, nbytes: int):
+        if self.link_kbps:
+            time.sleep(nbytes * 8 / (self.link_kbps * 1000))
+
+    def _handler(self):
+        wm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self) -> bytes:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                wm._link_delay(len(body))
+                return body
+
+            def _send(self, code: int, obj=None):
+                data = json.dumps(obj).encode("utf-8") if obj is not None else b""
+                wm._link_delay(len(data))
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self._body()
+                self._send(200, {"status": "ok"})
+
+            def do_DELETE(self):
+                self._send(200, {})
+
+            def do_GET(self):
+                q = parse_qs(urlsplit(self.path).query)
+                self._send(200, wm.node_profiles(int(q["locationid"][0]), int(q["nodeid"][0])))
+
+            def do_PUT(self):
+                body = json.loads(self._body())
+                try:
+                    psk = body["wirelessProfile"]["securityMode"]["pskPassphrase"]
+                    profile = wm.by_id[body["id"]]
+                except (KeyError, TypeError):
+                    with wm._lock:
+                        wm.rejected += 1
+                    self._send(400, {"error": "id and wirelessProfile.securityMode.pskPassphrase required"})
+                    return
+                with wm._lock:
+                    # PUT nahrazuje celý profil – jako WM zachová jen pole, která generuje sám
+                    generated = {k: v for k, v in profile.items() if k in PUT_READONLY_FIELDS[VERSION]}
+                    profile.clear()
+                    profile.update(body)
+                    profile.update(generated)
+                    profile["revision"] += 1
+                self._send(200, {})
+
+        return Handler
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+
+def run(wm: MockWM, targets: list[tuple[int, int, str]], concurrency: int, minimal: bool) -> dict:
+    wm_metrics.reset()
+    local = threading.local()
+    sessions = []
+    expected: dict[tuple[int, int, str], str] = {}
+    lock = threading.Lock()
+
+    def session() -> requests.Session:
+        s = getattr(local, "session", None)
+        if s is None:
+            s = local.session = wm_metrics.instrument(requests.Session())
+            login_to_wm(s, wm.base_url, "bench", "bench")
+            with lock:
+                sessions.append(s)
+        return s
+
+    def rotate(target: tuple[int, int, str]):
+        location_id, node_id, name = target
+        s = session()
+        profile = find_profile(fetch_ssid_profiles(s, wm.base_url, location_id, node_id, VERSION), name)
+        psk = secrets.token_urlsafe(12)
+        update_profile_psk(profile, psk)
+        put_profile(s, wm.base_url, build_put_payload(profile, VERSION, minimal), VERSION)
+        with lock:
+            expected[target] = psk
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(rotate, targets))
+    seconds = time.perf_counter() - started
+
+    for s in sessions:
+        s.close()
+
+    # nové PSK musí být na "WM" v obou režimech a zbytek konfigurace beze změny
+    mismatches = 0
+    lost = 0
+    for (location_id, node_id, name), psk in expected.items():
+        profile = find_profile(wm.node_profiles(location_id, node_id), name)
+        if profile.get("wirelessProfile", {}).get("securityMode", {}).get("pskPassphrase") != psk:
+            mismatches += 1
+        original = wm.make_profile(location_id, node_id, name, int(name.rsplit("-", 1)[1]))
+        if _config_fields(profile) != _config_fields(original):
+            lost += 1
+
+    stats = wm_metrics.get_stats()
+    put = stats.get("PUT ssidprofiles", {})
+    return {
+        "mode": "minimal" if minimal else "full",
+        "seconds": round(seconds, 3),
+        "put_bytes": put.get("bytes_sent", 0),
+        "put_avg_bytes": round(put.get("bytes_sent", 0) / max(1, put.get("requests", 0))),
+        "put_avg_ms": put.get("avg_ms", 0.0),
+        "total": wm_metrics.totals(stats),
+        "mismatches": mismatches,
+        "lost": lost,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs. minimal WM PUT payload benchmark (local mock WM)")
+    parser.add_argument("--targets", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--link-kbps", type=float, default=0.0, help="simulated link bandwidth to WM (0 = unlimited)")
+    parser.add_argument("--sample", type=Path, help="JSON with a GET ssidprofiles response captured from WM")
+    args = parser.parse_args()
+
+    sample = load_sample(args.sample) if args.sample else None
+    wm = MockWM(args.link_kbps, sample).start()
+    targets = [(loc, 0, f"SITE{loc}-{loc % PROFILES_PER_NODE}") for loc in range(1, args.targets + 1)]
+    try:
+        results = [run(wm, targets, args.concurrency, minimal) for minimal in (False, True)]
+    finally:
+        wm.stop()
+
+    link = f"{args.link_kbps:g} kbps" if args.link_kbps else "unlimited"
+    profiles = f"sample {args.sample}" if sample else "synthetic (see --sample)"
+    print(f"{args.targets} target(s), concurrency {args.concurrency}, link {link}, profiles {profiles}\n")
+    print(
+        f"{'MODE':<8} {'WALL s':>8} {'PUT B':>12} {'B/PUT':>7} {'PUT ms':>7} "
+        f"{'SENT B':>12} {'RECV B':>12} {'BAD':>4} {'LOST':>5}"
+    )
+    for r in results:
+        t = r["total"]
+        print(
+            f"{r['mode']:<8} {r['seconds']:>8.2f} {r['put_bytes']:>12} {r['put_avg_bytes']:>7} "
+            f"{r['put_avg_ms']:>7.1f} {t['bytes_sent']:>12} {t['bytes_received']:>12} {r['mismatches']:>4} "
+            f"{r['lost']:>5}"
+        )
+
+    full, minimal = results
+    saved = full["put_bytes"] - minimal["put_bytes"]
+    print(
+        f"\nminimal PUT saves {saved} B ({saved / max(1, full['put_bytes']):.0%} of PUT upload) "
+        f"and {full['seconds'] - minimal['seconds']:.2f}s wall time; mock rejected {wm.rejected} PUT(s)"
+    )
+    if minimal["lost"] or minimal["mismatches"]:
+        print("WARNING: minimal PUT lost profile configuration – PUT_FIELD_ALLOWLIST is incomplete")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
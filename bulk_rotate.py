@@ -0,0 +1,205 @@
+"""
+Hromadná rotace PSK pro velký seznam targetů (CSV / JSONL).
+
+- targety se čtou ze souboru průběžně (řádek po řádku), celý seznam se
+  nikdy nedrží v paměti
+- rotace běží paralelně (ThreadPoolExecutor), každé worker vlákno má
+  vlastní přihlášenou session per WM base URL
+- výsledek každého targetu se hned zapíše do checkpoint souboru (JSONL);
+  přerušený běh se po opětovném spuštění se stejným checkpointem přeskočí
+  již úspěšné targety a pokračuje dál
+
+Sloupce / klíče jsou stejné jako u TARGETS v config.json
+(SSID_PROFILE_NAME, WM_LOCATION_ID, WM_NODE_ID, WM_BASE_URL, PUBLISH),
+chybějící hodnoty se doplní z config.json.
+
+Použití:
+  py -3.12 rotate_psk.py --bulk sites.csv --concurrency 16
+  py -3.12 rotate_psk.py --bulk sites.jsonl --checkpoint data\\sites.checkpoint.jsonl
+"""
+
+import csv
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+from app_config import AppConfig, ConfigError, Target, get_config, parse_target
+from rotate_psk import DATA_DIR, WmSessionPool, rotate_target
+
+DEFAULT_CONCURRENCY = 8
+
+logger = logging.getLogger("psk_bulk")
+
+
+# ---------------------------------------------------------------------------
+# Vstup
+# ---------------------------------------------------------------------------
+
+
+def _rows(path: Path) -> Iterator[dict]:
+    suffix = path.suffix.lower()
+    with path.open("r", encoding="utf-8", newline="") as f:
+        if suffix == ".csv":
+            yield from csv.DictReader(f)
+        elif suffix == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported bulk input {path} (use .csv or .jsonl)")
+
+
+def _coerce(value: str):
+    # CSV vrací jen stringy – PUBLISH=true/false převedeme na bool
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return value
+
+
+def iter_targets(path: Path, cfg: AppConfig) -> Iterator[Target]:
+    """
+    Postupně vrací targety ze souboru. Vadné řádky se zalogují a přeskočí.
+    """
+    for lineno, row in enumerate(_rows(path), start=1):
+        entry = {
+            str(k).strip().upper(): _coerce(v)
+            for k, v in row.items()
+            if k is not None and v not in (None, "")
+        }
+        try:
+            yield parse_target(entry, cfg.raw)
+        except ConfigError as e:
+            logger.error("Skipping %s row %s: %s", path.name, lineno, e)
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint
+# ---------------------------------------------------------------------------
+
+
+class Checkpoint:
+    """
+    Append-only JSONL: {"key", "status": "ok" | "failed", "ts", "seconds"}.
+    Pro poslední záznam daného targetu platí vždy ten nejnovější.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.done: set[str] = set()
+        self._lock = threading.Lock()
+
+        if self.path.is_file():
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        # useknutý poslední řádek po pádu
+                        continue
+                    if rec.get("status") == "ok":
+                        self.done.add(rec["key"])
+                    else:
+                        self.done.discard(rec["key"])
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def record(self, key: str, ok: bool, seconds: float):
+        rec = {
+            "key": key,
+            "status": "ok" if ok else "failed",
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "seconds": round(seconds, 3),
+        }
+        with self._lock:
+            self._file.write(json.dumps(rec) + "\n")
+            self._file.flush()
+            if ok:
+                self.done.add(key)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# ---------------------------------------------------------------------------
+# Bulk run
+# ---------------------------------------------------------------------------
+
+
+def default_checkpoint_path(input_path: Path) -> Path:
+    return DATA_DIR / f"{input_path.stem}.checkpoint.jsonl"
+
+
+def run_bulk(
+    input_path: Path,
+    checkpoint_path: Path | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> dict:
+    """
+    Zrotuje všechny targety ze souboru. Vrací statistiku
+    {"ok", "failed", "skipped", "seconds"}.
+    """
+    cfg = get_config()
+    input_path = Path(input_path)
+    checkpoint = Checkpoint(checkpoint_path or default_checkpoint_path(input_path))
+    sessions = WmSessionPool(cfg)
+    stats = {"ok": 0, "failed": 0, "skipped": 0}
+    stats_lock = threading.Lock()
+
+    if checkpoint.done:
+        logger.info("Resuming bulk run, %s targets already done", len(checkpoint.done))
+
+    def work(target: Target):
+        started = time.perf_counter()
+        try:
+            session = sessions.get(target.base_url)
+            ok = rotate_target(target, cfg, session)
+            if not ok:
+                sessions.drop(target.base_url)
+        except Exception as e:
+            logger.error("Bulk rotation of '%s' failed: %s", target.key, e)
+            ok = False
+        checkpoint.record(target.key, ok, time.perf_counter() - started)
+        with stats_lock:
+            stats["ok" if ok else "failed"] += 1
+
+    started = time.perf_counter()
+    in_flight: set[Future] = set()
+    # omezené okno rozpracovaných targetů → konstantní paměť i pro obří vstup
+    window = max(1, concurrency) * 2
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="bulk") as pool:
+            try:
+                for target in iter_targets(input_path, cfg):
+                    if target.key in checkpoint.done:
+                        with stats_lock:
+                            stats["skipped"] += 1
+                        continue
+
+                    if len(in_flight) >= window:
+                        _done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    in_flight.add(pool.submit(work, target))
+            except KeyboardInterrupt:
+                logger.warning("Bulk run interrupted, waiting for in-flight targets")
+                for fut in in_flight:
+                    fut.cancel()
+                raise
+    finally:
+        sessions.close()
+        checkpoint.close()
+
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(
+            "Bulk rotation finished: %(ok)s ok, %(failed)s failed, "
+            "%(skipped)s skipped (already done) in %(seconds)ss",
+            stats,
+        )
+
+    return stats
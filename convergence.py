@@ -0,0 +1,143 @@
+"""
+Ověření, že se nové PSK na WM opravdu projevilo (post-PUT convergence).
+
+HTTP 2xx na PUT ještě neznamená, že WM nové PSK aplikoval. S VERIFY_CONVERGENCE
+v configu se po PUT profil znovu čte (s exponenciálním backoffem), dokud
+pskPassphrase neodpovídá novému PSK, nebo nevyprší deadline. Stav pro web UI
+se publikuje až po úspěšném ověření.
+
+config.json:
+  "VERIFY_CONVERGENCE": {"TIMEOUT_SECONDS": 60, "INITIAL_DELAY_SECONDS": 0.5,
+                         "MAX_DELAY_SECONDS": 5}
+
+Čas do konvergence per target se ukládá do data/convergence_metrics.json.
+"""
+
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from app_config import write_atomic
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+METRICS_FILE = DATA_DIR / "convergence_metrics.json"
+
+logger = logging.getLogger("psk_convergence")
+
+
+class ConvergenceError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class ConvergenceSettings:
+    timeout_seconds: float = 60.0
+    initial_delay_seconds: float = 0.5
+    max_delay_seconds: float = 5.0
+
+    @classmethod
+    def from_config(cls, cfg) -> "ConvergenceSettings | None":
+        raw = cfg.get("VERIFY_CONVERGENCE")
+        if not raw:
+            return None
+        if raw is True:
+            return cls()
+        return cls(
+            timeout_seconds=max(1.0, float(raw.get("TIMEOUT_SECONDS", cls.timeout_seconds))),
+            initial_delay_seconds=max(0.0, float(raw.get("INITIAL_DELAY_SECONDS", cls.initial_delay_seconds))),
+            max_delay_seconds=max(0.1, float(raw.get("MAX_DELAY_SECONDS", cls.max_delay_seconds))),
+        )
+
+
+def read_psk(profile: dict | None) -> str | None:
+    try:
+        return profile["wirelessProfile"]["securityMode"]["pskPassphrase"]
+    except (KeyError, TypeError):
+        return None
+
+
+def wait_for_psk(
+    key: str,
+    fetch: Callable[[], dict | None],
+    psk: str,
+    settings: ConvergenceSettings,
+) -> float:
+    """
+    Opakovaně volá fetch() (vrací aktuální profil z WM), dokud profil nemá
+    nové PSK. Vrací sekundy od začátku ověřování; po deadline ConvergenceError.
+    Chyby čtení se jen logují a zkouší se dál.
+    """
+    started = time.monotonic()
+    deadline = started + settings.timeout_seconds
+    delay = settings.initial_delay_seconds
+    reads = 0
+
+    while True:
+        if delay:
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        reads += 1
+        try:
+            if read_psk(fetch()) == psk:
+                elapsed = time.monotonic() - started
+                _record(key, elapsed, reads, ok=True)
+                logger.info("PSK converged on '%s' in %.2fs (%s read(s))", key, elapsed, reads)
+                return elapsed
+        except Exception as e:
+            logger.warning("Convergence check of '%s' failed: %s", key, e)
+
+        if time.monotonic() >= deadline:
+            elapsed = time.monotonic() - started
+            _record(key, elapsed, reads, ok=False)
+            raise ConvergenceError(
+                f"new PSK not reflected on '{key}' after {elapsed:.1f}s ({reads} read(s))"
+            )
+        delay = min(settings.max_delay_seconds, max(delay * 2, 0.1))
+
+
+# ---------------------------------------------------------------------------
+# Metriky
+# ---------------------------------------------------------------------------
+
+_metrics: dict[str, dict] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> dict:
+    with _metrics_lock:
+        return {k: dict(v) for k, v in _metrics.items()}
+
+
+def _record(key: str, elapsed: float, reads: int, ok: bool):
+    with _metrics_lock:
+        if not _metrics and METRICS_FILE.exists():
+            # metriky přežijí restart – navázat na uložené
+            try:
+                _metrics.update(json.loads(METRICS_FILE.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                pass
+
+        m = _metrics.setdefault(
+            key,
+            {"converged": 0, "timeouts": 0, "last_seconds": 0.0, "avg_seconds": 0.0, "max_seconds": 0.0},
+        )
+        m["last_reads"] = reads
+        m["updated_utc"] = datetime.now(timezone.utc).isoformat()
+        if ok:
+            m["converged"] += 1
+            m["last_seconds"] = round(elapsed, 3)
+            m["avg_seconds"] = round(m["avg_seconds"] + (elapsed - m["avg_seconds"]) / m["converged"], 3)
+            m["max_seconds"] = round(max(m["max_seconds"], elapsed), 3)
+        else:
+            m["timeouts"] += 1
+        snapshot = json.dumps(_metrics, indent=2)
+
+        try:
+            write_atomic(METRICS_FILE, snapshot)
+        except OSError as e:
+            logger.debug("Cannot write %s: %s", METRICS_FILE, e)
@@ -0,0 +1,252 @@
+"""
+Zdroje WM credentials (WM_KEY_ID / WM_KEY_VALUE) s in-process cache.
+
+Backendy (config.json → CREDENTIAL_PROVIDER):
+  - "registry" – HKLM\\SOFTWARE\\AristaPskRotator (default na Windows)
+  - "keyring"  – systémový keyring (Windows Credential Manager, Secret Service, ...)
+  - "env"      – proměnné prostředí WM_KEY_ID / WM_KEY_VALUE
+  - "file"     – JSON soubor (CREDENTIALS_FILE, default credentials.json)
+
+Pro více WM controllerů se credentials hledají nejdřív pro konkrétní
+WM_BASE_URL a teprve pak ve výchozím (sdíleném) umístění:
+  - registry: podklíč SOFTWARE\\AristaPskRotator\\<host>
+  - keyring:  service "AristaPskRotator:<host>", jinak "AristaPskRotator"
+  - env:      WM_KEY_ID__<HOST> / WM_KEY_VALUE__<HOST> (host velkými, ne-alfanum. → _)
+  - file:     {"<base_url>": {"WM_KEY_ID": ..., "WM_KEY_VALUE": ...}, "default": {...}}
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from urllib.parse import urlparse
+
+BASE_DIR = Path(__file__).resolve().parent
+
+REG_PATH = r"SOFTWARE\AristaPskRotator"
+KEYRING_SERVICE = "AristaPskRotator"
+DEFAULT_CREDENTIALS_FILE = BASE_DIR / "credentials.json"
+DEFAULT_CACHE_TTL_SECONDS = 300
+
+logger = logging.getLogger("psk_credentials")
+
+
+def _host_of(base_url: str | None) -> str | None:
+    if not base_url:
+        return None
+    return urlparse(base_url).hostname or base_url.rstrip("/")
+
+
+def _validate(key_id, key_value, source: str) -> tuple[str, str]:
+    if not key_id or not key_value:
+        raise RuntimeError(f"WM_KEY_ID / WM_KEY_VALUE in {source} are empty")
+    return str(key_id), str(key_value)
+
+
+# ---------------------------------------------------------------------------
+# Providers
+# ---------------------------------------------------------------------------
+
+
+class CredentialProvider(ABC):
+    """
+    Rozhraní: get(base_url) → (WM_KEY_ID, WM_KEY_VALUE).
+    Na on-prem: WM_KEY_ID = username, WM_KEY_VALUE = password.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def get(self, base_url: str | None = None) -> tuple[str, str]: ...
+
+
+class RegistryCredentialProvider(CredentialProvider):
+    name = "registry"
+
+    def get(self, base_url: str | None = None) -> tuple[str, str]:
+        import winreg  # jen Windows
+
+        host = _host_of(base_url)
+        paths = ([rf"{REG_PATH}\{host}"] if host else []) + [REG_PATH]
+
+        for path in paths:
+            try:
+                key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path)
+            except FileNotFoundError:
+                continue
+
+            try:
+                key_id, _ = winreg.QueryValueEx(key, "WM_KEY_ID")
+                key_value, _ = winreg.QueryValueEx(key, "WM_KEY_VALUE")
+            except FileNotFoundError as e:
+                raise RuntimeError(
+                    f"Registry values WM_KEY_ID / WM_KEY_VALUE not found under HKLM\\{path}"
+                ) from e
+            finally:
+                winreg.CloseKey(key)
+
+            return _validate(key_id, key_value, "registry")
+
+        raise RuntimeError(
+            rf"Registry key HKLM\{REG_PATH} not found. Run deploy.py to create it."
+        )
+
+
+class KeyringCredentialProvider(CredentialProvider):
+    name = "keyring"
+
+    def get(self, base_url: str | None = None) -> tuple[str, str]:
+        import keyring
+
+        host = _host_of(base_url)
+        services = ([f"{KEYRING_SERVICE}:{host}"] if host else []) + [KEYRING_SERVICE]
+
+        for service in services:
+            key_id = keyring.get_password(service, "WM_KEY_ID")
+            key_value = keyring.get_password(service, "WM_KEY_VALUE")
+            if key_id or key_value:
+                return _validate(key_id, key_value, f"keyring service '{service}'")
+
+        raise RuntimeError(
+            f"WM_KEY_ID / WM_KEY_VALUE not found in keyring (service '{KEYRING_SERVICE}')"
+        )
+
+
+class EnvCredentialProvider(CredentialProvider):
+    name = "env"
+
+    def get(self, base_url: str | None = None) -> tuple[str, str]:
+        host = _host_of(base_url)
+        suffixes = ([re.sub(r"[^A-Z0-9]", "_", host.upper())] if host else []) + [""]
+
+        for suffix in suffixes:
+            tail = f"__{suffix}" if suffix else ""
+            key_id = os.environ.get(f"WM_KEY_ID{tail}")
+            key_value = os.environ.get(f"WM_KEY_VALUE{tail}")
+            if key_id or key_value:
+                return _validate(key_id, key_value, f"environment (WM_KEY_ID{tail})")
+
+        raise RuntimeError("Environment variables WM_KEY_ID / WM_KEY_VALUE not set")
+
+
+class FileCredentialProvider(CredentialProvider):
+    name = "file"
+
+    def __init__(self, path: Path = DEFAULT_CREDENTIALS_FILE):
+        self.path = Path(path)
+
+    def get(self, base_url: str | None = None) -> tuple[str, str]:
+        if not self.path.is_file():
+            raise RuntimeError(f"Credentials file {self.path} missing")
+
+        with self.path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        # plochý formát {"WM_KEY_ID": ..., "WM_KEY_VALUE": ...}
+        if "WM_KEY_ID" in data:
+            return _validate(data.get("WM_KEY_ID"), data.get("WM_KEY_VALUE"), str(self.path))
+
+        keys = []
+        if base_url:
+            keys += [base_url, base_url.rstrip("/"), _host_of(base_url)]
+        keys.append("default")
+
+        for k in keys:
+            entry = data.get(k)
+            if entry:
+                return _validate(entry.get("WM_KEY_ID"), entry.get("WM_KEY_VALUE"), str(self.path))
+
+        raise RuntimeError(f"No credentials for '{base_url}' in {self.path}")
+
+
+class CachedCredentialProvider(CredentialProvider):
+    """
+    Obal s TTL cache per base URL – hromadné rotace nečtou secret pro každý
+    target znovu.
+    """
+
+    def __init__(self, inner: CredentialProvider, ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS):
+        self.inner = inner
+        self.name = inner.name
+        self.ttl_seconds = ttl_seconds
+        self._cache: dict[str | None, tuple[float, tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, base_url: str | None = None) -> tuple[str, str]:
+        key = base_url.rstrip("/") if base_url else None
+        now = time.monotonic()
+
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and hit[0] > now:
+                return hit[1]
+
+            creds = self.inner.get(base_url)
+            self._cache[key] = (now + self.ttl_seconds, creds)
+            logger.debug("Loaded WM credentials for %s from %s", key or "default", self.name)
+            return creds
+
+    def invalidate(self, base_url: str | None = None):
+        with self._lock:
+            if base_url is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(base_url.rstrip("/"), None)
+
+
+PROVIDERS = {
+    "registry": RegistryCredentialProvider,
+    "keyring": KeyringCredentialProvider,
+    "env": EnvCredentialProvider,
+    "file": FileCredentialProvider,
+}
+
+
+# ---------------------------------------------------------------------------
+# Výběr provideru podle configu
+# ---------------------------------------------------------------------------
+
+_provider: CachedCredentialProvider | None = None
+_provider_key: tuple | None = None
+_provider_lock = threading.Lock()
+
+
+def get_provider(cfg: dict | None = None) -> CachedCredentialProvider:
+    """
+    Vrátí (sdílený) provider podle CREDENTIAL_PROVIDER, CREDENTIALS_FILE
+    a CREDENTIAL_CACHE_TTL_SECONDS. Při změně configu se provider vymění.
+    """
+    global _provider, _provider_key
+    cfg = cfg or {}
+
+    default = "registry" if sys.platform == "win32" else "env"
+    name = str(cfg.get("CREDENTIAL_PROVIDER") or default).lower()
+    if name not in PROVIDERS:
+        raise RuntimeError(
+            f"Unknown CREDENTIAL_PROVIDER '{name}' (use one of: {', '.join(PROVIDERS)})"
+        )
+    ttl = float(cfg.get("CREDENTIAL_CACHE_TTL_SECONDS", DEFAULT_CACHE_TTL_SECONDS))
+    file_path = cfg.get("CREDENTIALS_FILE")
+
+    key = (name, ttl, file_path)
+    with _provider_lock:
+        if _provider is None or _provider_key != key:
+            if name == "file":
+                path = Path(file_path) if file_path else DEFAULT_CREDENTIALS_FILE
+                if not path.is_absolute():
+                    path = BASE_DIR / path
+                inner = FileCredentialProvider(path)
+            else:
+                inner = PROVIDERS[name]()
+            _provider = CachedCredentialProvider(inner, ttl)
+            _provider_key = key
+        return _provider
+
+
+def get_credentials(base_url: str | None = None, cfg: dict | None = None) -> tuple[str, str]:
+    return get_provider(cfg).get(base_url)
@@ -0,0 +1,448 @@
+"""
+Koordinace více instancí rotátoru (HA) přes lease.
+
+Každý node se pravidelně hlásí (heartbeat) do sdíleného úložiště. Targety
+se mezi živé nody rozdělí rendezvous hashingem, takže každý node rotuje jen
+svou část. Před rotací si node na target vezme lease (výhradní zámek s TTL);
+dokud lease platí, nikdo jiný target rotovat nemůže. Když node umře, přestane
+se hlásit, po LEASE_TTL_SECONDS vypadne ze seznamu živých nodů a jeho targety
+převezmou ostatní.
+
+Úložiště (config.json → LEASE_BACKEND):
+  - "sqlite"    – SQLite soubor LEASE_PATH (default data/leases.sqlite),
+                  na jednom stroji nebo sdíleném disku
+  - "directory" – sdílená složka LEASE_PATH (SMB share apod.), jeden JSON
+                  soubor na lease / node, zápis pod lock souborem
+
+Bez LEASE_BACKEND koordinace neběží a node rotuje všechny targety.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterable
+
+from app_config import Target, write_atomic
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+
+DEFAULT_LEASE_TTL_SECONDS = 120
+
+logger = logging.getLogger("psk_leader")
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+# ---------------------------------------------------------------------------
+# Úložiště leases
+# ---------------------------------------------------------------------------
+
+
+class LeaseStore(ABC):
+    """
+    Rozhraní úložiště. Všechny časy jsou epoch sekundy (time.time()),
+    hodiny nodů by měly být synchronizované (NTP).
+    """
+
+    @abstractmethod
+    def heartbeat(self, node_id: str, ttl: float): ...
+
+    @abstractmethod
+    def live_nodes(self) -> list[str]: ...
+
+    @abstractmethod
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool: ...
+
+    @abstractmethod
+    def release(self, key: str, owner: str): ...
+
+    @abstractmethod
+    def complete(self, key: str, owner: str, cycle: str):
+        """
+        Poznamená, že target byl v daném cyklu (plánovaném termínu) zrotován.
+        """
+
+    @abstractmethod
+    def done_cycle(self, key: str) -> str | None: ...
+
+
+class SqliteLeaseStore(LeaseStore):
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS leases (
+        key        TEXT PRIMARY KEY,
+        owner      TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        done_cycle TEXT
+    );
+    CREATE TABLE IF NOT EXISTS nodes (
+        node_id    TEXT PRIMARY KEY,
+        expires_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._conn.executescript(self._SCHEMA)
+
+    def heartbeat(self, node_id: str, ttl: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO nodes (node_id, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(node_id) DO UPDATE SET expires_at = excluded.expires_at",
+                (node_id, time.time() + ttl),
+            )
+
+    def live_nodes(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT node_id FROM nodes WHERE expires_at > ? ORDER BY node_id",
+                (time.time(),),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            # compare-and-set: převzít jen volný / expirovaný / vlastní lease
+            self._conn.execute(
+                "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, "
+                "expires_at = excluded.expires_at "
+                "WHERE leases.expires_at <= ? OR leases.owner = excluded.owner",
+                (key, owner, now + ttl, now),
+            )
+            row = self._conn.execute("SELECT owner FROM leases WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] == owner
+
+    def release(self, key: str, owner: str):
+        # řádek zůstává kvůli done_cycle, jen lease vyprší
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE leases SET expires_at = 0 WHERE key = ? AND owner = ?", (key, owner)
+            )
+
+    def complete(self, key: str, owner: str, cycle: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE leases SET done_cycle = ? WHERE key = ? AND owner = ?", (cycle, key, owner)
+            )
+
+    def done_cycle(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT done_cycle FROM leases WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+class DirectoryLeaseStore(LeaseStore):
+    """
+    Lease jako JSON soubor ve sdílené složce. Čtení a zápis leasu probíhá
+    pod lock souborem vytvořeným přes O_CREAT | O_EXCL (atomické i na SMB).
+    """
+
+    LOCK_STALE_SECONDS = 30
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        (self.path / "leases").mkdir(parents=True, exist_ok=True)
+        (self.path / "nodes").mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _read(path: Path) -> dict | None:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _write(path: Path, data: dict):
+        write_atomic(path, json.dumps(data))
+
+    @contextmanager
+    def _locked(self, name: str):
+        lock_path = self.path / "leases" / f"{name}.lock"
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                # lock po spadlém procesu
+                try:
+                    if time.time() - lock_path.stat().st_mtime > self.LOCK_STALE_SECONDS:
+                        lock_path.unlink(missing_ok=True)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Cannot lock lease {lock_path}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            lock_path.unlink(missing_ok=True)
+
+    def heartbeat(self, node_id: str, ttl: float):
+        path = self.path / "nodes" / f"{self._name(node_id)}.json"
+        self._write(path, {"node_id": node_id, "expires_at": time.time() + ttl})
+
+    def live_nodes(self) -> list[str]:
+        now = time.time()
+        nodes = []
+        for path in (self.path / "nodes").glob("*.json"):
+            data = self._read(path)
+            if data and data.get("expires_at", 0) > now:
+                nodes.append(data["node_id"])
+        return sorted(nodes)
+
+    def try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        name = self._name(key)
+        path = self.path / "leases" / f"{name}.json"
+        with self._locked(name):
+            now = time.time()
+            current = self._read(path)
+            if current and current.get("owner") != owner and current.get("expires_at", 0) > now:
+                return False
+            done_cycle = (current or {}).get("done_cycle")
+            self._write(
+                path,
+                {"key": key, "owner": owner, "expires_at": now + ttl, "done_cycle": done_cycle},
+            )
+            return True
+
+    def _update_own(self, key: str, owner: str, **changes):
+        name = self._name(key)
+        path = self.path / "leases" / f"{name}.json"
+        with self._locked(name):
+            current = self._read(path)
+            if current and current.get("owner") == owner:
+                self._write(path, {**current, **changes})
+
+    def release(self, key: str, owner: str):
+        # soubor zůstává kvůli done_cycle, jen lease vyprší
+        self._update_own(key, owner, expires_at=0)
+
+    def complete(self, key: str, owner: str, cycle: str):
+        self._update_own(key, owner, done_cycle=cycle)
+
+    def done_cycle(self, key: str) -> str | None:
+        data = self._read(self.path / "leases" / f"{self._name(key)}.json")
+        return (data or {}).get("done_cycle")
+
+
+# ---------------------------------------------------------------------------
+# Plánované termíny
+# ---------------------------------------------------------------------------
+
+
+def next_interval_slot(interval: timedelta, now: datetime | None = None) -> datetime:
+    """
+    Další termín intervalové rotace zarovnaný na epochu (hranice slotů
+    floor(epoch / interval)) – všechny nody tak míří na stejný čas bez
+    ohledu na to, kdy který nastartoval.
+    """
+    seconds = interval.total_seconds()
+    now = now or datetime.now()
+    return datetime.fromtimestamp((math.floor(now.timestamp() / seconds) + 1) * seconds)
+
+
+def schedule_cycle(mode: str, value, run_at: datetime) -> str:
+    """
+    Id plánovaného termínu pro run_cycle(), stejné na všech nodech:
+    u intervalu číslo slotu, u denní rotace datum a čas.
+    """
+    if mode == "interval":
+        seconds = value.total_seconds()
+        return f"interval-{int(seconds)}-{math.floor(run_at.timestamp() / seconds + 1e-6)}"
+    return run_at.isoformat(timespec="minutes")
+
+
+# ---------------------------------------------------------------------------
+# Koordinátor
+# ---------------------------------------------------------------------------
+
+
+def _score(node_id: str, key: str) -> int:
+    return int.from_bytes(hashlib.sha256(f"{node_id}|{key}".encode("utf-8")).digest()[:8], "big")
+
+
+def assign_owner(key: str, nodes: Iterable[str]) -> str | None:
+    """
+    Rendezvous (HRW) hashing – při změně počtu nodů se přesunou jen targety
+    odcházejícího / přicházejícího nodu.
+    """
+    return max(nodes, key=lambda n: _score(n, key), default=None)
+
+
+class Coordinator:
+    def __init__(self, store: LeaseStore, node_id: str | None = None, ttl: float = DEFAULT_LEASE_TTL_SECONDS):
+        self.store = store
+        self.node_id = node_id or default_node_id()
+        self.ttl = float(ttl)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def heartbeat(self):
+        self.store.heartbeat(self.node_id, self.ttl)
+
+    def start_heartbeat(self):
+        """
+        Daemon vlákno, které node hlásí jako živý každou třetinu TTL.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    logger.error("Lease heartbeat failed: %s", e)
+                self._stop.wait(self.ttl / 3)
+
+        self.heartbeat()
+        self._thread = threading.Thread(target=loop, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def owned_targets(self, targets: Iterable[Target]) -> list[Target]:
+        """
+        Targety, které podle rendezvous hashingu patří tomuto nodu.
+        """
+        nodes = self.store.live_nodes()
+        if self.node_id not in nodes:
+            nodes.append(self.node_id)
+        return [t for t in targets if assign_owner(t.key, nodes) == self.node_id]
+
+    def acquire(self, target: Target) -> bool:
+        try:
+            ok = self.store.try_acquire(target.key, self.node_id, self.ttl)
+        except Exception as e:
+            logger.error("Cannot acquire lease for '%s': %s", target.key, e)
+            return False
+        if not ok:
+            logger.info("Target '%s' is leased by another node, skipping", target.key)
+        return ok
+
+    def release(self, target: Target):
+        try:
+            self.store.release(target.key, self.node_id)
+        except Exception as e:
+            logger.warning("Cannot release lease for '%s': %s", target.key, e)
+
+    def complete(self, target: Target, cycle: str):
+        try:
+            self.store.complete(target.key, self.node_id, cycle)
+        except Exception as e:
+            # lease ještě platí – do TTL target nikdo jiný nezrotuje
+            logger.error("Cannot mark '%s' rotated in cycle %s: %s", target.key, cycle, e)
+
+    def run_cycle(
+        self,
+        cycle: str,
+        targets: Iterable[Target],
+        rotate: Callable[[list[Target]], dict[str, bool]],
+        wait: Callable[[float], bool],
+        max_wait: float | None = None,
+    ) -> dict[str, bool]:
+        """
+        Provede jeden plánovaný cyklus rotace (cycle = id termínu, stejné na
+        všech nodech, viz schedule_cycle()).
+
+        Node rotuje targety, které mu patří a v tomto cyklu ještě nikdo
+        nezrotoval. Ostatní sleduje až 2× TTL (nejvýš max_wait s, typicky
+        kratší než interval plánu): pokud jejich vlastník mezitím umře,
+        připadnou tomuto nodu a zrotuje je sám. wait(seconds) vrací False,
+        pokud se má čekání přerušit (stop služby).
+        """
+        pending = {t.key: t for t in targets}
+        results: dict[str, bool] = {}
+        watch = 2 * self.ttl + 30
+        if max_wait is not None:
+            watch = min(watch, max_wait)
+        deadline = time.monotonic() + watch
+
+        while pending:
+            # chyba sdíleného úložiště (share, zamčená SQLite) = target není
+            # ani hotový, ani náš; zkusí se znovu v dalším kole
+            unknown: set[str] = set()
+            for key in list(pending):
+                try:
+                    if self.store.done_cycle(key) == cycle:
+                        pending.pop(key)
+                except Exception as e:
+                    logger.error("Cannot read lease state of '%s': %s", key, e)
+                    unknown.add(key)
+
+            try:
+                owned = self.owned_targets(t for t in pending.values() if t.key not in unknown)
+            except Exception as e:
+                logger.error("Cannot read live nodes from lease store: %s", e)
+                owned = []
+
+            mine = [t for t in owned if self.acquire(t)]
+            if mine:
+                outcome = rotate(mine)
+                for t in mine:
+                    ok = bool(outcome.get(t.key))
+                    results[t.key] = ok
+                    pending.pop(t.key, None)
+                    if ok:
+                        # lease necháme doběhnout – brání dvojí rotaci při
+                        # rozdílném pohledu nodů na členství
+                        self.complete(t, cycle)
+                    else:
+                        self.release(t)
+
+            if not pending or time.monotonic() >= deadline:
+                break
+            if not wait(min(30.0, self.ttl / 4)):
+                break
+
+        if pending:
+            logger.info(
+                "Cycle %s: %s target(s) handled by other nodes", cycle, len(pending)
+            )
+        return results
+
+
+def coordinator_from_config(cfg) -> Coordinator | None:
+    backend = str(cfg.get("LEASE_BACKEND") or "").lower()
+    if not backend:
+        return None
+
+    ttl = float(cfg.get("LEASE_TTL_SECONDS", DEFAULT_LEASE_TTL_SECONDS))
+    node_id = cfg.get("NODE_ID") or None
+
+    if backend == "sqlite":
+        path = Path(cfg.get("LEASE_PATH") or DATA_DIR / "leases.sqlite")
+        store: LeaseStore = SqliteLeaseStore(path)
+    elif backend == "directory":
+        if not cfg.get("LEASE_PATH"):
+            raise RuntimeError("LEASE_BACKEND=directory requires LEASE_PATH (shared folder)")
+        store = DirectoryLeaseStore(Path(cfg["LEASE_PATH"]))
+    else:
+        raise RuntimeError(f"Unknown LEASE_BACKEND '{backend}' (use sqlite or directory)")
+
+    return Coordinator(store, node_id, ttl)
@@ -0,0 +1,311 @@
+"""
+Notifikace navazujících systémů (signage, helpdesk, MDM) po každé rotaci.
+
+Po úspěšné rotaci se pro každý webhook z NOTIFY_WEBHOOKS zapíše záznam do
+trvalého outboxu (outbox.py) – to je jediná práce na cestě rotace. Doručení
+obstarává dispatcher na pozadí: asyncio smyčka v samostatném vlákně s
+omezeným počtem workerů (NOTIFY_WORKERS). HTTP volání běží ve vlastním
+thread poolu o stejné velikosti (ne v defaultním executoru), délku
+doručení hlídá (connect, read) timeout requests. Na jeden endpoint běží
+vždy nejvýš jedno doručení, takže pomalý příjemce drží jen jednoho
+workera a ostatní endpointy nezdržuje.
+
+config.json:
+  "NOTIFY_WORKERS": 4,
+  "NOTIFY_WEBHOOKS": [
+    {"NAME": "signage", "URL": "https://signage.local/hook",
+     "TIMEOUT_SECONDS": 5, "MAX_ATTEMPTS": 10,
+     "HEADERS": {"Authorization": "Bearer ..."}}
+  ]
+
+Latence doručení per endpoint se drží v paměti (get_metrics()) a ukládá
+do data/notify_metrics.json.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from app_config import write_atomic
+from outbox import Outbox, get_outbox
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+METRICS_FILE = DATA_DIR / "notify_metrics.json"
+
+QUEUE = "notify"
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT_SECONDS = 5.0
+DEFAULT_MAX_ATTEMPTS = 10
+MAX_BACKOFF_SECONDS = 300
+
+logger = logging.getLogger("psk_notify")
+
+
+def _endpoints(cfg) -> list[dict]:
+    endpoints = []
+    for i, ep in enumerate(cfg.get("NOTIFY_WEBHOOKS") or ()):
+        if not ep.get("URL"):
+            logger.error("NOTIFY_WEBHOOKS[%s] has no URL, skipping", i)
+            continue
+        endpoints.append(
+            {
+                "name": str(ep.get("NAME") or ep["URL"]),
+                "url": str(ep["URL"]),
+                "timeout": float(ep.get("TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS)),
+                "max_attempts": int(ep.get("MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+                "headers": dict(ep.get("HEADERS") or {}),
+            }
+        )
+    return endpoints
+
+
+# ---------------------------------------------------------------------------
+# Dispatcher
+# ---------------------------------------------------------------------------
+
+
+class NotificationDispatcher:
+    def __init__(self, outbox: Outbox, workers: int = DEFAULT_WORKERS):
+        self.outbox = outbox
+        self.workers = max(1, workers)
+        self.metrics: dict[str, dict] = {}
+
+        self._stop = threading.Event()
+        self._busy: set[str] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._http: ThreadPoolExecutor | None = None
+        self._db: ThreadPoolExecutor | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._main()),
+            name="notify-dispatcher",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.wake()
+
+    def wake(self):
+        loop, event = self._loop, self._wake
+        if loop is None or event is None:
+            return  # smyčka ještě neběží – frontu stejně přečte hned po startu
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # smyčka už skončila
+
+    def idle(self) -> bool:
+        with self._lock:
+            busy = bool(self._busy)
+        return not busy and self.outbox.pending_count(QUEUE) == 0
+
+    # -- smyčka --------------------------------------------------------------
+
+    async def _db_call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db, fn, *args)
+
+    async def _main(self):
+        # HTTP jen ve vlastním poolu – počet souběžných doručení = workers
+        self._http = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="notify-http")
+        # SQLite outbox je serializovaný zámkem, víc vláken nepomůže
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notify-outbox")
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+
+        while not self._stop.is_set():
+            try:
+                rows = await self._db_call(self.outbox.due, QUEUE, 500, True)
+            except Exception as e:
+                logger.error("Cannot read notify outbox: %s", e)
+                rows = []
+
+            for row in rows:
+                endpoint = row["key"]
+                with self._lock:
+                    # jedno doručení per endpoint → pořadí zachováno, pomalý
+                    # endpoint blokuje jen sám sebe
+                    if endpoint in self._busy:
+                        continue
+                    self._busy.add(endpoint)
+                queue.put_nowait(row)
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+        for w in workers:
+            w.cancel()
+        self._loop = None
+        self._http.shutdown(wait=False)
+        self._db.shutdown(wait=True)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            row = await queue.get()
+            try:
+                await self._deliver(row)
+            except Exception as e:
+                logger.exception("Notify worker error: %s", e)
+            finally:
+                with self._lock:
+                    self._busy.discard(row["key"])
+                self._wake.set()
+
+    async def _deliver(self, row: dict):
+        spec = row["payload"]
+        name = row["key"]
+        started = time.perf_counter()
+        error = None
+
+        def post() -> requests.Response:
+            # žádný asyncio timeout nad vláknem – to by běželo dál a endpoint by
+            # se uvolnil pro další doručení; limit je (connect, read) timeout
+            return requests.post(
+                spec["url"],
+                json=spec["body"],
+                headers=spec.get("headers") or {},
+                timeout=(spec["timeout"], spec["timeout"]),
+            )
+
+        try:
+            resp = await asyncio.get_running_loop().run_in_executor(self._http, post)
+            if not resp.ok:
+                error = f"HTTP {resp.status_code} {resp.text[:200]}"
+        except requests.Timeout:
+            error = f"timeout after {spec['timeout']}s"
+        except Exception as e:
+            error = str(e)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._record_metric(name, elapsed_ms, error is None)
+
+        if error is None:
+            await self._db_call(self.outbox.mark_done, row["id"])
+            logger.info("Notified '%s' in %.0f ms", name, elapsed_ms)
+            return
+
+        attempts = row["attempts"] + 1
+        if attempts >= spec["max_attempts"]:
+            await self._db_call(self.outbox.mark_dead, row["id"], error)
+            logger.error("Notify '%s' gave up after %s attempts: %s", name, attempts, error)
+        else:
+            delay = min(MAX_BACKOFF_SECONDS, 2 ** attempts)
+            await self._db_call(self.outbox.mark_retry, row["id"], error, delay)
+            logger.warning(
+                "Notify '%s' failed (attempt %s), retry in %ss: %s", name, attempts, delay, error
+            )
+
+    # -- metriky -------------------------------------------------------------
+
+    def _record_metric(self, name: str, elapsed_ms: float, ok: bool):
+        with self._lock:
+            m = self.metrics.setdefault(
+                name,
+                {"deliveries": 0, "failures": 0, "last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0},
+            )
+            m["deliveries" if ok else "failures"] += 1
+            n = m["deliveries"] + m["failures"]
+            m["last_ms"] = round(elapsed_ms, 1)
+            m["avg_ms"] = round(m["avg_ms"] + (elapsed_ms - m["avg_ms"]) / n, 1)
+            m["max_ms"] = round(max(m["max_ms"], elapsed_ms), 1)
+            m["updated_utc"] = datetime.now(timezone.utc).isoformat()
+            snapshot = json.dumps(self.metrics, indent=2)
+
+        try:
+            write_atomic(METRICS_FILE, snapshot)
+        except OSError as e:
+            logger.debug("Cannot write %s: %s", METRICS_FILE, e)
+
+
+_dispatcher: NotificationDispatcher | None = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(cfg=None) -> NotificationDispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            workers = int((cfg or {}).get("NOTIFY_WORKERS", DEFAULT_WORKERS))
+            _dispatcher = NotificationDispatcher(get_outbox(), workers)
+        _dispatcher.start()
+        return _dispatcher
+
+
+def get_metrics() -> dict:
+    if _dispatcher is None:
+        return {}
+    with _dispatcher._lock:
+        return {k: dict(v) for k, v in _dispatcher.metrics.items()}
+
+
+# ---------------------------------------------------------------------------
+# API pro rotate_psk
+# ---------------------------------------------------------------------------
+
+
+def notify_rotation(cfg, body: dict) -> int:
+    """
+    Zapíše notifikaci pro všechny NOTIFY_WEBHOOKS do outboxu a probudí
+    dispatcher. Nečeká na doručení. Vrací počet zařazených notifikací.
+    """
+    endpoints = _endpoints(cfg)
+    if not endpoints:
+        return 0
+
+    outbox = get_outbox()
+    for ep in endpoints:
+        outbox.enqueue(QUEUE, ep["name"], {**ep, "body": body})
+
+    get_dispatcher(cfg).wake()
+    return len(endpoints)
+
+
+def flush(timeout: float) -> bool:
+    """
+    Počká (max. timeout s), než dispatcher doručí vše, co je ve frontě.
+    Pro jednorázové spuštění z CLI – nedoručené zůstane v outboxu.
+    """
+    if _dispatcher is None:
+        return True
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if _dispatcher.idle():
+            return True
+        time.sleep(0.1)
+    return _dispatcher.idle()
+
+
+def shutdown(timeout: float) -> bool:
+    """
+    flush() a zastavení dispatcheru – volá se na konci jednorázového běhu.
+    """
+    delivered = flush(timeout)
+    if _dispatcher is not None:
+        _dispatcher.stop()
+        if _dispatcher._thread is not None:
+            _dispatcher._thread.join(2.0)
+    return delivered
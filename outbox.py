@@ -0,0 +1,173 @@
+"""
+Trvalá fronta (outbox) nad SQLite – private/outbox.sqlite.
+
+Soubor obsahuje PSK a hlavičky webhooků (tokeny), proto leží mimo data/
+servírované webem.
+
+Záznam přežije restart služby i pád procesu; zpracovaný záznam se smaže,
+neúspěšný se naplánuje znovu (next_attempt_at), po vyčerpání pokusů zůstane
+ve stavu "dead" pro ruční kontrolu. Jednotlivé fronty se rozlišují sloupcem
+queue (např. "notify", "rotation").
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app_config import private_path
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+OUTBOX_DB = private_path("outbox.sqlite", DATA_DIR / "outbox.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue           TEXT    NOT NULL,
+    key             TEXT    NOT NULL,
+    payload         TEXT    NOT NULL,
+    status          TEXT    NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL    NOT NULL,
+    created_utc     TEXT    NOT NULL,
+    last_error      TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_due ON outbox (queue, status, next_attempt_at, id);
+CREATE INDEX IF NOT EXISTS ix_outbox_key ON outbox (queue, key, status);
+"""
+
+
+class Outbox:
+    def __init__(self, db_path: Path = OUTBOX_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(
+        self,
+        queue: str,
+        key: str,
+        payload: dict,
+        delay_seconds: float = 0.0,
+        supersede: bool = False,
+    ) -> int:
+        """
+        supersede=True nahradí čekající záznamy se stejným klíčem (platí jen
+        nejnovější záměr). delay_seconds odloží první zpracování.
+        """
+        ts = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            if supersede:
+                self._conn.execute(
+                    "DELETE FROM outbox WHERE queue = ? AND key = ? AND status = 'pending'",
+                    (queue, key),
+                )
+            cur = self._conn.execute(
+                "INSERT INTO outbox (queue, key, payload, next_attempt_at, created_utc) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (queue, key, json.dumps(payload), time.time() + delay_seconds, ts),
+            )
+            return cur.lastrowid
+
+    def get(self, item_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM outbox WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
+            return None
+        item = dict(row)
+        item["payload"] = json.loads(item["payload"])
+        return item
+
+    def due(self, queue: str, limit: int = 100, heads_only: bool = False) -> list[dict]:
+        """
+        Záznamy připravené ke zpracování, nejstarší první.
+
+        heads_only=True vrátí pro každý klíč jen jeho nejstarší čekající
+        záznam (a jen pokud už je na řadě) – zachová pořadí v rámci klíče
+        i když starší záznam čeká na retry.
+        """
+        sql = (
+            "SELECT * FROM outbox o WHERE queue = ? AND status = 'pending' "
+            "AND next_attempt_at <= ? "
+        )
+        if heads_only:
+            sql += (
+                "AND id = (SELECT MIN(id) FROM outbox h WHERE h.queue = o.queue "
+                "AND h.key = o.key AND h.status = 'pending') "
+            )
+        sql += "ORDER BY id LIMIT ?"
+
+        with self._lock:
+            rows = self._conn.execute(sql, (queue, time.time(), int(limit))).fetchall()
+
+        out = []
+        for row in rows:
+            item = dict(row)
+            item["payload"] = json.loads(item["payload"])
+            out.append(item)
+        return out
+
+    def mark_done(self, item_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (item_id,))
+
+    def mark_retry(self, item_id: int, error: str, delay_seconds: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, "
+                "last_error = ? WHERE id = ?",
+                (time.time() + delay_seconds, error[:1000], item_id),
+            )
+
+    def mark_dead(self, item_id: int, error: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, status = 'dead', "
+                "last_error = ? WHERE id = ?",
+                (error[:1000], item_id),
+            )
+
+    def reschedule(self, queue: str, key_prefix: str) -> int:
+        """
+        Čekající záznamy s klíčem key_prefix*, které už aspoň jednou selhaly,
+        naplánuje na hned (např. když je WM zase dostupný).
+        """
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE outbox SET next_attempt_at = ? WHERE queue = ? AND status = 'pending' "
+                "AND attempts > 0 AND next_attempt_at > ? AND substr(key, 1, ?) = ?",
+                (time.time(), queue, time.time(), len(key_prefix), key_prefix),
+            )
+            return cur.rowcount
+
+    def pending_count(self, queue: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE queue = ? AND status = 'pending'",
+                (queue,),
+            ).fetchone()
+        return row[0]
+
+
+_outbox: Outbox | None = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
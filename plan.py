@@ -0,0 +1,139 @@
+"""
+Plan mode (dry run) – ověří, které targety půjde zrotovat, aniž by se cokoli
+měnilo.
+
+- přihlásí se na WM a paralelně načte SSID profily pro všechny dvojice
+  (location, node) z targetů – každá dvojice se čte jen jednou
+- každý target vyhodnotí stejnou logikou jako rotace (match_profiles /
+  find_profile): found / missing / ambiguous / error
+- negeneruje PSK, nerenderuje QR a nic neposílá přes PUT
+
+Použití:
+  py -3.12 rotate_psk.py --plan
+  py -3.12 rotate_psk.py --plan --bulk sites.csv --concurrency 16
+
+Report se vypíše na stdout a uloží do data/plan_report.json.
+"""
+
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable
+
+from app_config import AppConfig, Target, get_config, write_atomic
+from bulk_rotate import iter_targets
+from rotate_psk import DATA_DIR, WmSessionPool, fetch_ssid_profiles, match_profiles
+
+REPORT_FILE = DATA_DIR / "plan_report.json"
+DEFAULT_CONCURRENCY = 8
+
+logger = logging.getLogger("psk_plan")
+
+
+def _fetch_pair(sessions: WmSessionPool, cfg: AppConfig, pair: tuple[str, int, int]) -> dict:
+    base_url, location_id, node_id = pair
+    started = time.perf_counter()
+    try:
+        profiles = fetch_ssid_profiles(
+            sessions.get(base_url),
+            base_url,
+            location_id,
+            node_id,
+            cfg.get("WM_DEVICECONFIG_VERSION", "17"),
+        )
+        error = None
+    except Exception as e:
+        sessions.drop(base_url)
+        profiles, error = [], str(e)
+    return {
+        "profiles": profiles,
+        "error": error,
+        "fetch_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def resolve(target: Target, fetched: dict) -> dict:
+    row = {
+        "target": target.key,
+        "ssid_profile_name": target.ssid_profile_name,
+        "location_id": target.location_id,
+        "node_id": target.node_id,
+        "fetch_ms": fetched["fetch_ms"],
+    }
+    if fetched["error"]:
+        return {**row, "status": "error", "detail": fetched["error"]}
+
+    matches = match_profiles(fetched["profiles"], target.ssid_profile_name)
+    if not matches:
+        return {**row, "status": "missing", "detail": f"{len(fetched['profiles'])} profile(s) on node"}
+    if len(matches) > 1:
+        ids = ", ".join(str(m.get("id")) for m in matches)
+        return {**row, "status": "ambiguous", "profile_id": matches[0].get("id"), "detail": f"ids {ids}, first is used"}
+    return {**row, "status": "found", "profile_id": matches[0].get("id"), "detail": ""}
+
+
+def run_plan(
+    targets: Iterable[Target] | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> dict:
+    """
+    Vyhodnotí targety (default z configu). Vrací
+    {"targets": [...], "summary": {...}, "seconds": ...}.
+    """
+    cfg = get_config()
+    targets = list(cfg.targets if targets is None else targets)
+    pairs = sorted({(t.base_url, t.location_id, t.node_id) for t in targets})
+
+    started = time.perf_counter()
+    sessions = WmSessionPool(cfg)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="plan") as pool:
+            fetched = dict(zip(pairs, pool.map(lambda pair: _fetch_pair(sessions, cfg, pair), pairs)))
+    finally:
+        sessions.close()
+
+    rows = [resolve(t, fetched[(t.base_url, t.location_id, t.node_id)]) for t in targets]
+    summary = {s: 0 for s in ("found", "missing", "ambiguous", "error")}
+    for row in rows:
+        summary[row["status"]] += 1
+
+    report = {
+        "created_utc": datetime.now(timezone.utc).isoformat(),
+        "pairs": len(pairs),
+        "summary": summary,
+        "seconds": round(time.perf_counter() - started, 3),
+        "targets": rows,
+    }
+    try:
+        write_atomic(REPORT_FILE, json.dumps(report, indent=2))
+    except OSError as e:
+        logger.warning("Cannot write %s: %s", REPORT_FILE, e)
+    return report
+
+
+def print_report(report: dict, out=sys.stdout):
+    print(f"{'STATUS':<10} {'FETCH ms':>9}  {'TARGET':<50} DETAIL", file=out)
+    for row in report["targets"]:
+        print(
+            f"{row['status']:<10} {row['fetch_ms']:>9.1f}  {row['target']:<50} {row['detail']}",
+            file=out,
+        )
+    s = report["summary"]
+    print(
+        f"\n{len(report['targets'])} target(s), {report['pairs']} location/node pair(s) "
+        f"in {report['seconds']:.2f}s: {s['found']} found, {s['missing']} missing, "
+        f"{s['ambiguous']} ambiguous, {s['error']} error",
+        file=out,
+    )
+
+
+def main(bulk: Path | None = None, concurrency: int = DEFAULT_CONCURRENCY) -> bool:
+    targets = iter_targets(Path(bulk), get_config()) if bulk else None
+    report = run_plan(targets, concurrency)
+    print_report(report)
+    s = report["summary"]
+    return not (s["missing"] or s["error"])
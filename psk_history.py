@@ -0,0 +1,255 @@
+"""
+Historie PSK – append-only SQLite (private/psk_history.sqlite).
+
+Hesla se neukládají v čitelné podobě, jen jako HMAC-SHA256 s lokálním klíčem
+(private/psk_history.key). Klíč i databáze jsou mimo data/, které servíruje
+web UI – s klíčem by šlo hashe zpětně dohledat hrubou silou. Všechny hashe
+jsou při startu načtené do paměti, takže kontrola opakování je O(1) lookup
+v dictu.
+
+Audit z příkazové řádky:
+  py -3.12 psk_history.py                   # posledních 50 rotací
+  py -3.12 psk_history.py --ssid TSK_TEST --since 2025-01-01 --limit 500
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable
+
+from app_config import private_path
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+
+HISTORY_DB = private_path("psk_history.sqlite", DATA_DIR / "psk_history.sqlite")
+HISTORY_KEY = private_path("psk_history.key", DATA_DIR / "psk_history.key")
+
+# "global" = heslo se nesmí opakovat napříč všemi SSID, "ssid" = jen v rámci SSID
+SCOPES = ("global", "ssid")
+
+logger = logging.getLogger("psk_history")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS psk_history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    ssid        TEXT    NOT NULL,
+    psk_hash    TEXT    NOT NULL,
+    rotated_utc TEXT    NOT NULL,
+    location_id INTEGER,
+    node_id     INTEGER,
+    note        TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_psk_history_hash ON psk_history (psk_hash);
+CREATE INDEX IF NOT EXISTS ix_psk_history_ssid ON psk_history (ssid, rotated_utc);
+CREATE TRIGGER IF NOT EXISTS psk_history_no_update
+    BEFORE UPDATE ON psk_history
+    BEGIN SELECT RAISE(ABORT, 'psk_history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS psk_history_no_delete
+    BEFORE DELETE ON psk_history
+    BEGIN SELECT RAISE(ABORT, 'psk_history is append-only'); END;
+"""
+
+
+def _load_or_create_key(key_path: Path) -> bytes:
+    if key_path.is_file():
+        return bytes.fromhex(key_path.read_text(encoding="utf-8").strip())
+
+    key = secrets.token_bytes(32)
+    key_path.parent.mkdir(parents=True, exist_ok=True)
+    key_path.write_text(key.hex(), encoding="utf-8")
+    return key
+
+
+class PskHistory:
+    def __init__(self, db_path: Path = HISTORY_DB, key_path: Path = HISTORY_KEY):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._key = _load_or_create_key(Path(key_path))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+
+        # psk_hash -> množina SSID, kde už heslo bylo použito
+        self._seen: dict[str, set[str]] = {}
+        # vygenerovaná, ale ještě nezapsaná hesla (staged / rozpracované
+        # rotace v tomto procesu) – dvě souběžné generace nedostanou stejné
+        self._reserved: set[str] = set()
+        for row in self._conn.execute("SELECT ssid, psk_hash FROM psk_history"):
+            self._seen.setdefault(row["psk_hash"], set()).add(row["ssid"])
+
+        logger.debug("Loaded %s PSK hashes from %s", len(self._seen), self.db_path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # -- hash index ----------------------------------------------------------
+
+    def psk_hash(self, psk: str) -> str:
+        return hmac.new(self._key, psk.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _seen_hash(self, digest: str, ssid: str | None, scope: str) -> bool:
+        ssids = self._seen.get(digest)
+        if not ssids:
+            return False
+        return scope == "global" or ssid in ssids
+
+    def seen(self, psk: str, ssid: str | None = None, scope: str = "global") -> bool:
+        """
+        True, pokud už heslo bylo použito (globálně, nebo pro dané SSID).
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown PSK reuse scope '{scope}'")
+        return self._seen_hash(self.psk_hash(psk), ssid, scope)
+
+    # -- zápis ---------------------------------------------------------------
+
+    def record(
+        self,
+        ssid: str,
+        psk: str,
+        location_id: int | None = None,
+        node_id: int | None = None,
+        note: str | None = None,
+    ):
+        digest = self.psk_hash(psk)
+        ts = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO psk_history "
+                    "(ssid, psk_hash, rotated_utc, location_id, node_id, note) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (ssid, digest, ts, location_id, node_id, note),
+                )
+            self._seen.setdefault(digest, set()).add(ssid)
+            self._reserved.discard(digest)
+
+    def reserve(self, psk: str):
+        """
+        Rezervuje už vygenerované heslo (např. staged z předchozího běhu).
+        """
+        with self._lock:
+            self._reserved.add(self.psk_hash(psk))
+
+    # -- generování ----------------------------------------------------------
+
+    def generate_unique(
+        self,
+        ssid: str,
+        generator: Callable[[], str],
+        scope: str = "global",
+        max_attempts: int = 50,
+    ) -> str:
+        """
+        Volá generator(), dokud nevrátí heslo, které ještě nebylo použito ani
+        není rezervované jinou rozpracovanou rotací. Vrácené heslo se
+        rezervuje až do record().
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown PSK reuse scope '{scope}'")
+
+        for attempt in range(1, max_attempts + 1):
+            psk = generator()
+            digest = self.psk_hash(psk)
+            with self._lock:
+                if self._seen_hash(digest, ssid, scope):
+                    logger.warning("Generated PSK collides with history (attempt %s)", attempt)
+                    continue
+                if digest in self._reserved:
+                    continue
+                self._reserved.add(digest)
+            return psk
+
+        raise RuntimeError(
+            f"Cannot generate unique PSK for '{ssid}' in {max_attempts} attempts"
+        )
+
+    def generate_bulk(
+        self,
+        items: Iterable[tuple[str, str]],
+        generator: Callable[[], str],
+        scope: str = "global",
+    ) -> dict[str, str]:
+        """
+        Vygeneruje PSK pro dávku (key, ssid) – typicky (target.key,
+        target.ssid_profile_name). Hesla jsou unikátní vůči historii
+        i navzájem, i když více targetů sdílí SSID. Vrací {key: psk}.
+        """
+        return {key: self.generate_unique(ssid, generator, scope) for key, ssid in items}
+
+    # -- audit ---------------------------------------------------------------
+
+    def query(
+        self,
+        ssid: str | None = None,
+        since: str | None = None,
+        limit: int = 50,
+    ) -> list[dict]:
+        sql = "SELECT * FROM psk_history WHERE 1 = 1"
+        params: list = []
+        if ssid:
+            sql += " AND ssid = ?"
+            params.append(ssid)
+        if since:
+            sql += " AND rotated_utc >= ?"
+            params.append(since)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(int(limit))
+
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+
+# ---------------------------------------------------------------------------
+# Sdílená instance pro rotate_psk
+# ---------------------------------------------------------------------------
+
+_history: PskHistory | None = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> PskHistory:
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = PskHistory()
+        return _history
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="PSK rotation history (audit)")
+    parser.add_argument("--ssid", help="filter by SSID")
+    parser.add_argument("--since", help="ISO timestamp (UTC), e.g. 2025-01-01")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args(argv)
+
+    rows = get_history().query(args.ssid, args.since, args.limit)
+    for row in rows:
+        if args.json:
+            print(json.dumps(row))
+        else:
+            print(
+                f"{row['rotated_utc']}  {row['ssid']:<24} "
+                f"loc={row['location_id']} node={row['node_id']} "
+                f"hash={row['psk_hash'][:12]}"
+            )
+
+    if not rows:
+        print("No rotations recorded.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
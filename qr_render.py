@@ -0,0 +1,319 @@
+"""
+Dávkové renderování Wi-Fi QR kódů a tiskových karet (signage).
+
+Pro každý pár (ssid, psk) umí vyrobit:
+  - PNG  – QR kód (stejný jako v web UI)
+  - SVG  – vektorový QR kód pro další grafické zpracování
+  - PDF  – tisková karta A6 (300 dpi) s SSID, heslem a QR kódem
+
+Rendering běží paralelně v process poolu (QR + PIL je čistě CPU práce),
+hotové soubory se znovu použijí, pokud se payload od posledního běhu nezměnil.
+
+Název souboru = čitelné SSID + hash klíče položky (sloupec key, např. site
+nebo target; bez něj samotné SSID), takže se nepřepíšou ani SSID lišící
+se jen interpunkcí. Stejný klíč dvakrát v jedné dávce je chyba.
+
+Použití:
+  py -3.12 qr_render.py                      # aktuální stav z data/current_psk.json
+  py -3.12 qr_render.py --input sites.csv    # CSV se sloupci ssid,psk[,key]
+  py -3.12 qr_render.py --input sites.json --formats png,pdf --workers 8
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable
+
+from app_config import open_atomic, write_atomic
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+SIGNAGE_DIR = DATA_DIR / "signage"
+
+# manifest s hashi payloadů – podle něj se pozná, jestli je render aktuální
+CACHE_MANIFEST = ".render_cache.json"
+
+# zvýšit při změně vzhledu karty → vynutí nový render všech souborů
+RENDER_VERSION = "1"
+
+FORMATS = ("png", "svg", "pdf")
+
+logger = logging.getLogger("psk_qr_render")
+
+
+# ---------------------------------------------------------------------------
+# Payload + pomocné funkce
+# ---------------------------------------------------------------------------
+
+
+def wifi_qr_payload(ssid: str, psk: str) -> str:
+    """
+    Text QR kódu ve formátu, kterému rozumí Android i iOS kamera.
+    """
+    return f"WIFI:T:WPA;S:{ssid};P:{psk};H:false;;"
+
+
+def _safe_name(ssid: str) -> str:
+    # SSID může obsahovat znaky, které nejdou do názvu souboru
+    return re.sub(r"[^A-Za-z0-9._-]", "_", ssid) or "ssid"
+
+
+def output_name(ssid: str, fmt: str, key: str | None = None) -> str:
+    # _safe_name() není prostý – jednoznačnost zajišťuje hash klíče
+    suffix = hashlib.sha1((key or ssid).encode("utf-8")).hexdigest()[:8]
+    if fmt == "pdf":
+        return f"wifi_card_{_safe_name(ssid)}_{suffix}.pdf"
+    return f"wifi_qr_{_safe_name(ssid)}_{suffix}.{fmt}"
+
+
+def _payload_hash(ssid: str, psk: str, fmt: str) -> str:
+    raw = f"{RENDER_VERSION}|{fmt}|{wifi_qr_payload(ssid, psk)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Renderery (běží ve worker procesech)
+# ---------------------------------------------------------------------------
+
+
+def render_png(ssid: str, psk: str, path: Path):
+    import qrcode
+
+    img = qrcode.make(wifi_qr_payload(ssid, psk))
+    with open_atomic(path) as f:
+        img.save(f, format="PNG")
+
+
+def render_svg(ssid: str, psk: str, path: Path):
+    import qrcode
+    import qrcode.image.svg
+
+    img = qrcode.make(
+        wifi_qr_payload(ssid, psk),
+        image_factory=qrcode.image.svg.SvgPathImage,
+    )
+    with open_atomic(path) as f:
+        img.save(f)
+
+
+def render_pdf(ssid: str, psk: str, path: Path):
+    """
+    Tisková karta A6 na výšku (105 × 148 mm při 300 dpi).
+    """
+    import qrcode
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = 1240, 1748
+    card = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(card)
+
+    def font(size: int):
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:
+            # starší Pillow neumí velikost u defaultního fontu
+            return ImageFont.load_default()
+
+    def centered(text: str, y: int, size: int, fill: str):
+        f = font(size)
+        box = draw.textbbox((0, 0), text, font=f)
+        draw.text(((width - (box[2] - box[0])) // 2, y), text, font=f, fill=fill)
+
+    centered("WiFi Access", 90, 96, "#111827")
+    centered("Scan the QR code or type the password", 220, 40, "#6b7280")
+
+    centered("SSID", 340, 36, "#9ca3af")
+    centered(ssid, 395, 64, "#111827")
+
+    centered("PASSWORD", 530, 36, "#9ca3af")
+    centered(psk, 585, 64, "#4f46e5")
+
+    qr_img = qrcode.make(wifi_qr_payload(ssid, psk), box_size=20, border=2)
+    qr_img = qr_img.get_image().convert("RGB").resize((900, 900), Image.NEAREST)
+    card.paste(qr_img, ((width - 900) // 2, 760))
+
+    with open_atomic(path) as f:
+        card.save(f, format="PDF", resolution=300.0)
+
+
+RENDERERS = {
+    "png": render_png,
+    "svg": render_svg,
+    "pdf": render_pdf,
+}
+
+
+def _render_job(job: tuple[str, str, str, str]) -> tuple[str, float]:
+    ssid, psk, fmt, path = job
+    started = time.perf_counter()
+    RENDERERS[fmt](ssid, psk, Path(path))
+    return path, time.perf_counter() - started
+
+
+# ---------------------------------------------------------------------------
+# Batch
+# ---------------------------------------------------------------------------
+
+
+def _load_manifest(out_dir: Path) -> dict:
+    try:
+        with (out_dir / CACHE_MANIFEST).open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_manifest(out_dir: Path, manifest: dict):
+    write_atomic(out_dir / CACHE_MANIFEST, json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def render_batch(
+    items: Iterable[tuple[str, ...]],
+    out_dir: Path = SIGNAGE_DIR,
+    formats: Iterable[str] = FORMATS,
+    max_workers: int | None = None,
+) -> dict:
+    """
+    Vyrenderuje všechny (ssid, psk) nebo (ssid, psk, key) položky ve
+    zvolených formátech. Duplicitní klíč (bez key duplicitní SSID) → ValueError.
+
+    Soubory, jejichž payload se od minula nezměnil (a na disku pořád jsou),
+    se přeskočí. Vrací statistiku:
+      {"jobs", "rendered", "cached", "failed", "seconds", "per_second"}
+    """
+    formats = tuple(formats)
+    unknown = [f for f in formats if f not in RENDERERS]
+    if unknown:
+        raise ValueError(f"Unknown render format(s): {', '.join(unknown)}")
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _load_manifest(out_dir)
+
+    started = time.perf_counter()
+    jobs: list[tuple[str, str, str, str]] = []
+    hashes: dict[str, str] = {}
+    cached = 0
+
+    seen: set[str] = set()
+    for ssid, psk, *rest in items:
+        key = rest[0] if rest and rest[0] else None
+        if (key or ssid) in seen:
+            raise ValueError(f"Duplicate item {key or ssid!r} – add a unique key column")
+        seen.add(key or ssid)
+        for fmt in formats:
+            name = output_name(ssid, fmt, key)
+            digest = _payload_hash(ssid, psk, fmt)
+            if manifest.get(name) == digest and (out_dir / name).is_file():
+                cached += 1
+                continue
+            hashes[name] = digest
+            jobs.append((ssid, psk, fmt, str(out_dir / name)))
+
+    rendered = 0
+    failed = 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_render_job, job): job for job in jobs}
+            for fut in as_completed(futures):
+                ssid, _psk, fmt, path = futures[fut]
+                try:
+                    _path, seconds = fut.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error("Render %s for SSID '%s' failed: %s", fmt, ssid, e)
+                    continue
+                rendered += 1
+                manifest[Path(path).name] = hashes[Path(path).name]
+                logger.debug("Rendered %s in %.3fs", path, seconds)
+
+        _save_manifest(out_dir, manifest)
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "jobs": len(jobs) + cached,
+        "rendered": rendered,
+        "cached": cached,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "per_second": round(rendered / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    logger.info(
+        "Batch render done: %(rendered)s rendered, %(cached)s cached, "
+        "%(failed)s failed in %(seconds)ss (%(per_second)s renders/s)",
+        stats,
+    )
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Vstupy
+# ---------------------------------------------------------------------------
+
+
+def read_items(path: Path) -> list[tuple[str, str, str]]:
+    """
+    Načte (ssid, psk, key) položky z CSV (sloupce ssid,psk a volitelně key),
+    JSON (seznam objektů) nebo JSONL (objekt na řádek).
+    """
+    suffix = path.suffix.lower()
+    with path.open("r", encoding="utf-8", newline="") as f:
+        if suffix == ".csv":
+            rows = list(csv.DictReader(f))
+        elif suffix == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = json.load(f)
+
+    items = []
+    for row in rows:
+        ssid, psk = row.get("ssid"), row.get("psk")
+        if not ssid or not psk:
+            raise ValueError(f"Row without ssid/psk in {path}: {row!r}")
+        items.append((str(ssid), str(psk), str(row.get("key") or "")))
+    return items
+
+
+def read_current_state() -> list[tuple[str, str]]:
+    state_file = DATA_DIR / "current_psk.json"
+    if not state_file.is_file():
+        return []
+    with state_file.open("r", encoding="utf-8") as f:
+        state = json.load(f)
+    return [(state["ssid"], state["psk"])]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Batch Wi-Fi QR / signage renderer")
+    parser.add_argument("--input", type=Path, help="CSV / JSON / JSONL with ssid,psk[,key]")
+    parser.add_argument("--out", type=Path, default=SIGNAGE_DIR, help="output directory")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="png,svg,pdf")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+
+    items = read_items(args.input) if args.input else read_current_state()
+    if not items:
+        logger.error("Nothing to render (no input and no data/current_psk.json)")
+        sys.exit(1)
+
+    formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+    stats = render_batch(items, args.out, formats, args.workers)
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Replikace stavu web UI na více web nodů (push).
+
+Po každé publikované rotaci pošle rotátor nový stav (current_psk.json +
+předrenderovaný QR PNG) paralelně na všechny REPLICA_NODES, po každém běhu
+rotace i jeho výsledek (last_rotation.json pro /readyz):
+
+  POST <node>/api/ingest
+  X-PSK-Timestamp: <unix time>
+  X-PSK-Signature: hex(HMAC-SHA256(secret, "<timestamp>.<body>"))
+
+Sdílený secret je v proměnné prostředí PSK_REPLICATION_SECRET, případně
+v config.json jako REPLICATION_SECRET. Web node přijme jen podepsaný
+požadavek s čerstvým timestampem a vyšší verzí stavu, než jakou už má.
+
+Nedoručený push se zapíše do outboxu (queue "replication", na node a druh
+jen nejnovější) a ReplicaRetrier ho na pozadí opakuje s backoffem, dokud
+node stav nepřijme – node, který byl chvíli dole, tak nezůstane se starým
+PSK až do další rotace.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from app_config import get_config
+from outbox import get_outbox
+
+DEFAULT_TIMEOUT_SECONDS = 2.0
+DEFAULT_RETRIES = 3
+MAX_CLOCK_SKEW_SECONDS = 300
+
+QUEUE = "replication"
+MAX_BACKOFF_SECONDS = 300
+
+SIGNATURE_HEADER = "X-PSK-Signature"
+TIMESTAMP_HEADER = "X-PSK-Timestamp"
+
+logger = logging.getLogger("psk_replication")
+
+
+def get_secret(cfg) -> bytes | None:
+    secret = os.environ.get("PSK_REPLICATION_SECRET") or (cfg or {}).get("REPLICATION_SECRET")
+    return secret.encode("utf-8") if secret else None
+
+
+def sign(secret: bytes, timestamp: str, body: bytes) -> str:
+    return hmac.new(secret, timestamp.encode("ascii") + b"." + body, hashlib.sha256).hexdigest()
+
+
+def verify(secret: bytes, timestamp: str | None, signature: str | None, body: bytes) -> bool:
+    if not timestamp or not signature:
+        return False
+    try:
+        if abs(time.time() - float(timestamp)) > MAX_CLOCK_SKEW_SECONDS:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), signature)
+
+
+def build_payload(state: dict, qr_path: Path) -> bytes:
+    payload = {
+        "state": state,
+        "qr_png_b64": base64.b64encode(Path(qr_path).read_bytes()).decode("ascii"),
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+def build_last_rotation_payload(last_rotation: dict) -> bytes:
+    return json.dumps({"last_rotation": last_rotation}).encode("utf-8")
+
+
+def _push_one(url: str, body: bytes, secret: bytes, timeout: float, retries: int) -> tuple[bool, str]:
+    error = ""
+    for attempt in range(1, retries + 1):
+        ts = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            TIMESTAMP_HEADER: ts,
+            SIGNATURE_HEADER: sign(secret, ts, body),
+        }
+        try:
+            resp = requests.post(url, data=body, headers=headers, timeout=timeout)
+            # 409 = node už má stejnou nebo novější verzi
+            if resp.ok or resp.status_code == 409:
+                return True, ""
+            error = f"HTTP {resp.status_code} {resp.text[:200]}"
+            if 400 <= resp.status_code < 500:
+                break
+        except requests.RequestException as e:
+            error = str(e)
+        if attempt < retries:
+            time.sleep(0.2 * 2 ** (attempt - 1))
+    return False, error
+
+
+def push_state(cfg, state: dict, qr_path: Path) -> dict[str, bool]:
+    """
+    Pošle stav na všechny REPLICA_NODES paralelně. Vrací {node_url: ok}.
+    """
+    if not cfg.get("REPLICA_NODES"):
+        return {}
+    return _push_all(cfg, build_payload(state, qr_path), "state", f"State v{state.get('version')}")
+
+
+def push_last_rotation(cfg, last_rotation: dict) -> dict[str, bool]:
+    """
+    Pošle výsledek posledního běhu rotace na všechny REPLICA_NODES.
+    """
+    if not cfg.get("REPLICA_NODES"):
+        return {}
+    return _push_all(cfg, build_last_rotation_payload(last_rotation), "last_rotation", "Last rotation result")
+
+
+def _push_all(cfg, body: bytes, kind: str, what: str) -> dict[str, bool]:
+    nodes = [str(n).rstrip("/") for n in (cfg.get("REPLICA_NODES") or ())]
+
+    secret = get_secret(cfg)
+    if not secret:
+        logger.error("REPLICA_NODES set but no PSK_REPLICATION_SECRET / REPLICATION_SECRET")
+        return {n: False for n in nodes}
+
+    timeout = float(cfg.get("REPLICA_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS))
+    retries = max(1, int(cfg.get("REPLICA_RETRIES", DEFAULT_RETRIES)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(32, len(nodes)), thread_name_prefix="replica") as pool:
+        futures = {
+            n: pool.submit(_push_one, f"{n}/api/ingest", body, secret, timeout, retries)
+            for n in nodes
+        }
+        results = {}
+        for node, fut in futures.items():
+            ok, error = fut.result()
+            results[node] = ok
+            if not ok:
+                logger.error("%s push to %s failed, queued for retry: %s", what, node, error)
+                _queue_retry(node, kind, body)
+
+    logger.info(
+        "%s pushed to %s/%s web node(s) in %.0f ms",
+        what,
+        sum(results.values()),
+        len(nodes),
+        (time.perf_counter() - started) * 1000,
+    )
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Retry nedoručených pushů
+# ---------------------------------------------------------------------------
+
+
+def _queue_retry(node: str, kind: str, body: bytes):
+    try:
+        get_outbox().enqueue(
+            QUEUE,
+            f"{node}|{kind}",
+            {"node": node, "body": body.decode("utf-8")},
+            delay_seconds=2,
+            supersede=True,
+        )
+    except Exception as e:
+        logger.error("Cannot queue state push to %s: %s", node, e)
+        return
+    if _retrier is not None:
+        _retrier.wake()
+
+
+class ReplicaRetrier:
+    """
+    Na pozadí opakuje pushe z outboxu (backoff 2, 4, 8 … s, max
+    MAX_BACKOFF_SECONDS). Záznam se nevzdává – nahradí ho až novější stav.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="replica-retry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.retry_due()
+            except Exception as e:
+                logger.error("Cannot retry state pushes: %s", e)
+            self._wake.wait(1.0)
+            self._wake.clear()
+
+    def retry_due(self) -> dict[str, bool]:
+        """
+        Zkusí jednou všechny pushe, které jsou na řadě. Vrací {"<node>|<druh>": ok}.
+        """
+        outbox = get_outbox()
+        rows = outbox.due(QUEUE, 100, heads_only=True)
+        if not rows:
+            return {}
+
+        cfg = get_config()
+        secret = get_secret(cfg)
+        if not secret:
+            logger.error("Queued state pushes waiting, but no PSK_REPLICATION_SECRET / REPLICATION_SECRET")
+            return {}
+        timeout = float(cfg.get("REPLICA_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS))
+
+        def push(row: dict) -> tuple[bool, str]:
+            body = row["payload"]["body"].encode("utf-8")
+            node = row["payload"].get("node") or row["key"]
+            return _push_one(f"{node}/api/ingest", body, secret, timeout, 1)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(32, len(rows)), thread_name_prefix="replica") as pool:
+            for row, (ok, error) in zip(rows, pool.map(push, rows)):
+                results[row["key"]] = ok
+                if ok:
+                    outbox.mark_done(row["id"])
+                    logger.info("Queued state push to %s delivered", row["key"])
+                    continue
+                delay = min(MAX_BACKOFF_SECONDS, 2 ** (row["attempts"] + 1))
+                outbox.mark_retry(row["id"], error, delay)
+                logger.warning("State push to %s still failing, retry in %ss: %s", row["key"], delay, error)
+        return results
+
+
+_retrier: ReplicaRetrier | None = None
+_retrier_lock = threading.Lock()
+
+
+def get_retrier() -> ReplicaRetrier:
+    global _retrier
+    with _retrier_lock:
+        if _retrier is None:
+            _retrier = ReplicaRetrier()
+        return _retrier
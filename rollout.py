@@ -0,0 +1,166 @@
+"""
+Postupná (vlnová) rotace většího počtu targetů.
+
+Místo rotace všech lokací naráz:
+  1. canary vlna (CANARY_SIZE targetů) – jakákoli chyba rollout zastaví
+  2. další vlny po WAVE_SIZE targetech, uvnitř vlny paralelně (CONCURRENCY)
+  3. mezi vlnami pauza (PAUSE_SECONDS) a error-rate gate – když podíl chyb
+     ve vlně překročí MAX_ERROR_RATE, zbylé vlny se nespustí
+
+config.json:
+  "ROLLOUT": {"CANARY_SIZE": 1, "WAVE_SIZE": 50, "CONCURRENCY": 8,
+              "PAUSE_SECONDS": 30, "MAX_ERROR_RATE": 0.1}
+
+Časy jednotlivých vln se logují a ukládají do data/rollout_report.json,
+podle nich lze ladit velikost vln a paralelismus.
+"""
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Sequence
+
+from app_config import Target, write_atomic
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+REPORT_FILE = DATA_DIR / "rollout_report.json"
+
+logger = logging.getLogger("psk_rollout")
+
+
+@dataclass(frozen=True)
+class RolloutSettings:
+    canary_size: int = 1
+    wave_size: int = 50
+    concurrency: int = 8
+    pause_seconds: float = 30.0
+    max_error_rate: float = 0.1
+
+    @classmethod
+    def from_config(cls, cfg) -> "RolloutSettings | None":
+        raw = cfg.get("ROLLOUT")
+        if not raw:
+            return None
+        return cls(
+            canary_size=max(0, int(raw.get("CANARY_SIZE", cls.canary_size))),
+            wave_size=max(1, int(raw.get("WAVE_SIZE", cls.wave_size))),
+            concurrency=max(1, int(raw.get("CONCURRENCY", cls.concurrency))),
+            pause_seconds=max(0.0, float(raw.get("PAUSE_SECONDS", cls.pause_seconds))),
+            max_error_rate=min(1.0, max(0.0, float(raw.get("MAX_ERROR_RATE", cls.max_error_rate)))),
+        )
+
+
+def plan_waves(targets: Sequence[Target], settings: RolloutSettings) -> list[list[Target]]:
+    targets = list(targets)
+    waves = []
+    if settings.canary_size:
+        waves.append(targets[: settings.canary_size])
+        targets = targets[settings.canary_size:]
+    for i in range(0, len(targets), settings.wave_size):
+        waves.append(targets[i : i + settings.wave_size])
+    return [w for w in waves if w]
+
+
+def run_rollout(
+    targets: Sequence[Target],
+    rotate_one: Callable[[Target], bool],
+    settings: RolloutSettings,
+    wait: Callable[[float], bool] | None = None,
+) -> dict[str, bool]:
+    """
+    Provede rollout po vlnách. rotate_one(target) → ok. wait(seconds) vrací
+    False, pokud se má rollout přerušit (stop služby). Vrací {target.key: ok};
+    targety z nespuštěných vln mají False.
+    """
+    wait = wait or (lambda seconds: time.sleep(seconds) or True)
+    waves = plan_waves(targets, settings)
+    results: dict[str, bool] = {t.key: False for t in targets}
+    report = {
+        "started_utc": datetime.now(timezone.utc).isoformat(),
+        "targets": len(targets),
+        "settings": settings.__dict__,
+        "waves": [],
+        "aborted": None,
+    }
+    rollout_started = time.perf_counter()
+
+    for index, wave in enumerate(waves):
+        canary = index == 0 and settings.canary_size > 0
+        name = "canary" if canary else f"wave {index if settings.canary_size else index + 1}"
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=settings.concurrency, thread_name_prefix="rollout") as pool:
+            outcomes = list(pool.map(_safe(rotate_one), wave))
+        seconds = time.perf_counter() - started
+
+        failed = 0
+        for target, ok in zip(wave, outcomes):
+            results[target.key] = ok
+            failed += 0 if ok else 1
+        error_rate = failed / len(wave)
+
+        report["waves"].append(
+            {
+                "name": name,
+                "size": len(wave),
+                "ok": len(wave) - failed,
+                "failed": failed,
+                "seconds": round(seconds, 3),
+                "seconds_per_target": round(seconds / len(wave), 3),
+            }
+        )
+        logger.info(
+            "Rollout %s: %s/%s ok in %.1fs (error rate %.0f%%)",
+            name,
+            len(wave) - failed,
+            len(wave),
+            seconds,
+            error_rate * 100,
+        )
+
+        remaining = len(waves) - index - 1
+        if not remaining:
+            break
+
+        limit = 0.0 if canary else settings.max_error_rate
+        if error_rate > limit:
+            report["aborted"] = f"{name} error rate {error_rate:.0%} > {limit:.0%}"
+            logger.error(
+                "Rollout stopped after %s (%s), %s wave(s) not started",
+                name,
+                report["aborted"],
+                remaining,
+            )
+            break
+
+        if settings.pause_seconds and not wait(settings.pause_seconds):
+            report["aborted"] = "interrupted"
+            logger.warning("Rollout interrupted, %s wave(s) not started", remaining)
+            break
+
+    report["seconds"] = round(time.perf_counter() - rollout_started, 3)
+    _save_report(report)
+    return results
+
+
+def _safe(rotate_one: Callable[[Target], bool]) -> Callable[[Target], bool]:
+    def run(target: Target) -> bool:
+        try:
+            return bool(rotate_one(target))
+        except Exception as e:
+            logger.exception("Rollout of '%s' failed: %s", target.key, e)
+            return False
+
+    return run
+
+
+def _save_report(report: dict):
+    try:
+        write_atomic(REPORT_FILE, json.dumps(report, indent=2))
+    except OSError as e:
+        logger.warning("Cannot write %s: %s", REPORT_FILE, e)
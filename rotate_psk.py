@@ -1,16 +1,44 @@
+import argparse
+import hashlib
 import json
 import logging
+import os
 import sys
 import secrets
+import sqlite3
 import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Iterable
 
 import requests
 from wordfreq import top_n_list  # slovník slov
-import winreg
 import urllib3
 from urllib3.exceptions import InsecureRequestWarning
 
+from app_config import (
+    AppConfig,
+    Target,
+    apply_log_level,
+    get_config,
+    on_change,
+    private_path,
+    write_atomic,
+)
+from convergence import ConvergenceError, ConvergenceSettings, wait_for_psk
+from credentials import RegistryCredentialProvider, get_credentials, get_provider
+import notify
+import replication
+import rotation_outbox
+import wm_metrics
+from psk_history import get_history
+from replication import push_last_rotation, push_state
+from rollout import RolloutSettings, plan_waves, run_rollout
+from static_export import export_from_config
+
 # ---------------------------------------------------------------------------
 # Cesty a logging
 # ---------------------------------------------------------------------------
@@ -26,17 +54,10 @@ LOG_FILE = LOGS_DIR / "rotate.log"
 
 
 def setup_logging():
-    config_path = BASE_DIR / "config.json"
-    log_level = logging.INFO
-
-    if config_path.is_file():
-        try:
-            with config_path.open("r", encoding="utf-8") as f:
-                cfg = json.load(f)
-            lvl = cfg.get("LOG_LEVEL", "INFO").upper()
-            log_level = getattr(logging, lvl, logging.INFO)
-        except Exception:
-            pass
+    try:
+        log_level = get_config().log_level
+    except Exception:
+        log_level = logging.INFO
 
     handlers = [logging.FileHandler(LOG_FILE, encoding="utf-8")]
     if sys.stdout and sys.stdout.isatty():
@@ -50,6 +71,7 @@ def setup_logging():
 
 
 setup_logging()
+on_change(apply_log_level)
 logger = logging.getLogger("psk_rotator")
 
 # ---------------------------------------------------------------------------
@@ -57,17 +79,15 @@ logger = logging.getLogger("psk_rotator")
 # ---------------------------------------------------------------------------
 
 
-def load_config() -> dict:
-    config_path = BASE_DIR / "config.json"
-    if not config_path.is_file():
-        raise FileNotFoundError(f"Config file {config_path} missing")
-
-    with config_path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+def load_config() -> AppConfig:
+    """
+    Aktuální config (cache + hot reload, viz app_config.py).
+    """
+    return get_config()
 
 
 # ---------------------------------------------------------------------------
-# Čtení WM_KEY_ID / WM_KEY_VALUE z registry (HKLM\SOFTWARE\AristaPskRotator)
+# Čtení WM_KEY_ID / WM_KEY_VALUE (registry / keyring / env / file, viz credentials.py)
 # ---------------------------------------------------------------------------
 
 
@@ -80,30 +100,7 @@ def get_credentials_from_registry() -> tuple[str, str]:
       WM_KEY_ID    = username (např. api_user)
       WM_KEY_VALUE = password
     """
-    try:
-        key = winreg.OpenKey(
-            winreg.HKEY_LOCAL_MACHINE,
-            r"SOFTWARE\AristaPskRotator",
-        )
-    except FileNotFoundError as e:
-        raise RuntimeError(
-            r"Registry key HKLM\SOFTWARE\AristaPskRotator not found. "
-            r"Run deploy.py to create it."
-        ) from e
-
-    try:
-        key_id, _ = winreg.QueryValueEx(key, "WM_KEY_ID")
-        key_value, _ = winreg.QueryValueEx(key, "WM_KEY_VALUE")
-    except FileNotFoundError as e:
-        raise RuntimeError(
-            "Registry values WM_KEY_ID / WM_KEY_VALUE not found "
-            r"under HKLM\SOFTWARE\AristaPskRotator"
-        ) from e
-
-    if not key_id or not key_value:
-        raise RuntimeError("WM_KEY_ID / WM_KEY_VALUE in registry are empty")
-
-    return str(key_id), str(key_value)
+    return RegistryCredentialProvider().get()
 
 
 # ---------------------------------------------------------------------------
@@ -139,11 +136,68 @@ def generate_psk() -> str:
     return f"{words[0]}-{words[1]}-{words[2]}{digit}"
 
 
+def generate_unique_psk(ssid: str, cfg: AppConfig | None = None) -> str:
+    """
+    generate_psk() + kontrola proti historii (psk_history.py), aby se heslo
+    neopakovalo napříč SSID (PSK_REUSE_SCOPE="global", default) nebo
+    v rámci jednoho SSID (PSK_REUSE_SCOPE="ssid").
+
+    ssid je klíč historie – target.ssid_profile_name, stejně jako při zápisu
+    v record_psk_history() (skutečné SSID při generování ještě neznáme).
+    """
+    scope = (cfg or {}).get("PSK_REUSE_SCOPE", "global")
+    try:
+        history = get_history()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("PSK history unavailable, reuse check skipped: %s", e)
+        return generate_psk()
+    return history.generate_unique(ssid, generate_psk, scope)
+
+
+def record_psk_history(ssid: str, psk: str, target: Target):
+    # historie je audit – chyba zápisu nesmí shodit už provedenou rotaci;
+    # klíčem je název profilu (viz generate_unique_psk), skutečné SSID jde do note
+    try:
+        get_history().record(
+            target.ssid_profile_name,
+            psk,
+            location_id=target.location_id,
+            node_id=target.node_id,
+            note=None if ssid == target.ssid_profile_name else f"ssid={ssid}",
+        )
+    except Exception as e:
+        logger.error("Cannot record PSK history for '%s': %s", ssid, e)
+
+
 # ---------------------------------------------------------------------------
 # WM Login / API
 # ---------------------------------------------------------------------------
 
 
+class WmApiError(RuntimeError):
+    """
+    Chybová odpověď WM API; status_code rozlišuje 4xx (opakování nepomůže)
+    od 5xx.
+    """
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    True pro chyby, které může spravit pozdější pokus: WM nedostupný nebo
+    timeout, 5xx / 429, WM nové PSK zatím nepřevzal. Chybějící profil,
+    odmítnutý payload apod. se opakováním nespraví.
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, ConvergenceError)):
+        return True
+    if isinstance(error, WmApiError):
+        return error.status_code >= 500 or error.status_code == 429
+    return False
+
+
 def login_to_wm(
     session: requests.Session,
     base_url: str,
@@ -166,7 +220,7 @@ def login_to_wm(
     headers = {"Content-Type": "application/json", "Version": version}
     resp = session.post(url, json=payload, headers=headers, timeout=15)
     if not resp.ok:
-        raise RuntimeError(f"Login failed: {resp.status_code} {resp.text}")
+        raise WmApiError(f"Login failed: {resp.status_code} {resp.text}", resp.status_code)
 
 
 def fetch_ssid_profiles(
@@ -181,7 +235,7 @@ def fetch_ssid_profiles(
     headers = {"Content-Type": "application/json", "Version": version}
     resp = session.get(url, params=params, headers=headers, timeout=20)
     if not resp.ok:
-        raise RuntimeError(f"GET ssidprofiles failed: {resp.status_code} {resp.text}")
+        raise WmApiError(f"GET ssidprofiles failed: {resp.status_code} {resp.text}", resp.status_code)
     return resp.json()
 
 
@@ -192,6 +246,82 @@ def update_profile_psk(profile: dict, new_psk: str):
         raise RuntimeError("Profile missing PSK field") from e
 
 
+# Pole SSID profilu pro PUT s WM_MINIMAL_PUT, per WM_DEVICECONFIG_VERSION
+# (cesty oddělené tečkou). PUT profil na WM nahrazuje celý, proto allow-list
+# obsahuje všechna konfigurační pole (celý wirelessProfile – securityMode,
+# band, vlanId, broadcastSsid …) a vynechává jen pole, která generuje WM
+# sám (PUT_READONLY_FIELDS). Seznam read-only polí není ověřený proti
+# zachycené odpovědi GET .../deviceconfiguration/ssidprofiles verze 17 –
+# před zapnutím WM_MINIMAL_PUT ho porovnej s vlastním WM (bench_wm_payload.py
+# --sample). Pole z GET, které není ani v jednom seznamu, se pošle také –
+# neznámé pole se nikdy potichu nezahodí.
+PUT_FIELD_ALLOWLIST = {
+    "17": ("id", "templateName", "ssid", "locationId", "nodeId", "enabled", "wirelessProfile"),
+}
+PUT_READONLY_FIELDS = {
+    "17": (
+        "createdBy",
+        "createdAt",
+        "modifiedBy",
+        "modifiedAt",
+        "revision",
+        "inheritedFrom",
+        "statistics",
+        "appliedDevices",
+    ),
+}
+_unknown_put_fields: set[str] = set()
+
+
+def build_put_payload(
+    profile: dict,
+    version: str = "17",
+    minimal: bool = False,
+    fields: Iterable[str] | None = None,
+) -> dict:
+    """
+    Tělo PUT: celý profil, nebo (minimal=True) jen pole z allow-listu pro
+    danou verzi API (fields = WM_PUT_FIELDS ho přepíše). Pro neznámou verzi
+    se posílá celý profil.
+    """
+    if not minimal:
+        return profile
+
+    if fields:
+        fields = tuple(fields)
+    else:
+        fields = PUT_FIELD_ALLOWLIST.get(str(version), ())
+        if not fields:
+            logger.warning("No PUT field allow-list for API version %s, sending full profile", version)
+            return profile
+        known = {f.split(".", 1)[0] for f in fields} | set(PUT_READONLY_FIELDS.get(str(version), ()))
+        unknown = sorted(k for k in profile if k not in known)
+        if unknown:
+            fields = fields + tuple(unknown)
+            new = set(unknown) - _unknown_put_fields
+            if new:
+                _unknown_put_fields.update(new)
+                logger.warning(
+                    "SSID profile field(s) %s not in the PUT allow-list for API version %s, sending them",
+                    ", ".join(sorted(new)),
+                    version,
+                )
+
+    payload: dict = {}
+    for path in fields:
+        *parents, leaf = path.split(".")
+        src = profile
+        for part in parents:
+            src = src.get(part) if isinstance(src, dict) else None
+        if not isinstance(src, dict) or leaf not in src:
+            continue
+        dst = payload
+        for part in parents:
+            dst = dst.setdefault(part, {})
+        dst[leaf] = src[leaf]
+    return payload
+
+
 def put_profile(
     session: requests.Session,
     base_url: str,
@@ -202,7 +332,7 @@ def put_profile(
     headers = {"Content-Type": "application/json", "Version": version}
     resp = session.put(url, json=profile, headers=headers, timeout=20)
     if not resp.ok:
-        raise RuntimeError(f"PUT failed: {resp.status_code} {resp.text}")
+        raise WmApiError(f"PUT failed: {resp.status_code} {resp.text}", resp.status_code)
 
 
 def logout_from_wm(session: requests.Session, base_url: str, version: str = "latest"):
@@ -231,10 +361,29 @@ def logout_from_wm(session: requests.Session, base_url: str, version: str = "lat
 # Save State for Web UI
 # ---------------------------------------------------------------------------
 
+STATE_FILE = DATA_DIR / "current_psk.json"
+LAST_ROTATION_FILE = DATA_DIR / "last_rotation.json"
+
+# předpřipravené další rotace (PSK + QR) per target, viz stage_next_psk();
+# obsahují příští PSK, proto mimo servírované data/
+STAGING_DIR = private_path("staged", DATA_DIR / "staged")
+
 
-def save_state(ssid: str, psk: str):
+def _write_json_atomic(path: Path, data: dict):
+    # zápis přes tmp + os.replace → web UI nikdy nepřečte rozepsaný soubor
+    write_atomic(path, json.dumps(data, indent=2))
+
+
+def save_state(ssid: str, psk: str, staged: dict | None = None) -> dict:
+    """
+    Publikuje nový stav pro web UI (QR PNG + current_psk.json) a vrátí ho.
+
+    Pokud je k dispozici předpřipravený QR ze stage_next_psk() pro stejné
+    SSID/heslo, jen se přesune na místo (os.replace) – žádný render na
+    kritické cestě.
+    """
     from datetime import datetime, timezone
-    import qrcode
+    from qr_render import render_png
 
     ts = datetime.now(timezone.utc).isoformat()
     out = {
@@ -242,118 +391,697 @@ def save_state(ssid: str, psk: str):
         "psk": psk,
         "last_rotated_utc": ts,
         "qr_image": f"wifi_qr_{ssid}.png",
+        # monotónní verze stavu – web nody při replikaci odmítnou starší
+        "version": time.time_ns(),
     }
 
-    # JSON
-    with (DATA_DIR / "current_psk.json").open("w", encoding="utf-8") as f:
-        json.dump(out, f, indent=2)
+    # QR – nejdřív obrázek, pak JSON, aby JSON nikdy neukazoval na starý QR
+    staged_qr = STAGING_DIR / staged["qr_file"] if staged and staged.get("qr_file") else None
+    if (
+        staged_qr is not None
+        and staged.get("ssid") == ssid
+        and staged.get("psk") == psk
+        and staged_qr.is_file()
+    ):
+        os.replace(staged_qr, DATA_DIR / out["qr_image"])
+    else:
+        render_png(ssid, psk, DATA_DIR / out["qr_image"])
 
-    # QR
-    img = qrcode.make(f"WIFI:T:WPA;S:{ssid};P:{psk};H:false;;")
-    img.save(DATA_DIR / out["qr_image"])
+    # JSON
+    _write_json_atomic(STATE_FILE, out)
+    return out
 
 
 # ---------------------------------------------------------------------------
-# ROTATE
+# Pre-staging další rotace
 # ---------------------------------------------------------------------------
 
 
-def rotate_once() -> bool:
-    session: requests.Session | None = None
+def _staged_file(target: Target) -> Path:
+    digest = hashlib.sha1(target.key.encode("utf-8")).hexdigest()[:12]
+    return STAGING_DIR / f"next_psk_{digest}.json"
+
+
+def _guess_display_ssid(target: Target) -> str:
+    # skutečné SSID známe až z profilu na WM – do té doby bereme poslední
+    # publikované (SSID se při rotaci nemění)
+    if target.publish:
+        try:
+            with STATE_FILE.open("r", encoding="utf-8") as f:
+                return json.load(f).get("ssid") or target.ssid_profile_name
+        except Exception:
+            pass
+    return target.ssid_profile_name
+
+
+def load_staged(target: Target) -> dict | None:
+    path = _staged_file(target)
     try:
-        logger.info("Starting PSK rotation...")
-        cfg = load_config()
+        with path.open("r", encoding="utf-8") as f:
+            staged = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable staged PSK %s: %s", path, e)
+        return None
 
-        base_url = cfg["WM_BASE_URL"].rstrip("/")
-        ssid_name = cfg["SSID_PROFILE_NAME"]
-        node_id = int(cfg["WM_NODE_ID"])
+    if staged.get("target") != target.key or not staged.get("psk"):
+        return None
+    return staged
 
-        # on-prem: location id je dáno přímo v configu
-        if "WM_LOCATION_ID" not in cfg:
-            raise RuntimeError(
-                "WM_LOCATION_ID is missing in config.json "
-                "(on-prem mode requires explicit location id)."
+
+def clear_staged(target: Target, staged: dict | None):
+    current = load_staged(target)
+    if current and staged and current.get("psk") != staged.get("psk"):
+        # na disku je už jiné (novější) staged PSK – to nemazat
+        return
+    _staged_file(target).unlink(missing_ok=True)
+    if staged and staged.get("qr_file"):
+        (STAGING_DIR / staged["qr_file"]).unlink(missing_ok=True)
+
+
+def stage_next_psk(
+    target: Target,
+    cfg: AppConfig | None = None,
+    psk: str | None = None,
+) -> dict:
+    """
+    Předem vygeneruje příští PSK (nebo použije zadané) a (pro publikovaný
+    target) vyrenderuje k němu QR do private/staged/.
+
+    Vrací již existující stage, pokud pro daný target nějaká je – opakované
+    volání tak nemění heslo, které se při cutoveru pošle na WM.
+    """
+    from datetime import datetime, timezone
+    from qr_render import render_png
+
+    staged = load_staged(target)
+    if staged:
+        return staged
+
+    ssid = _guess_display_ssid(target)
+    psk = psk or generate_unique_psk(target.ssid_profile_name, cfg)
+
+    STAGING_DIR.mkdir(exist_ok=True)
+    stage_file = _staged_file(target)
+    qr_file = None
+    if target.publish:
+        qr_file = stage_file.with_suffix(".png").name
+        render_png(ssid, psk, STAGING_DIR / qr_file)
+
+    staged = {
+        "target": target.key,
+        "ssid": ssid,
+        "psk": psk,
+        "qr_file": qr_file,
+        "staged_utc": datetime.now(timezone.utc).isoformat(),
+    }
+    _write_json_atomic(stage_file, staged)
+    logger.info("Staged next PSK for profile '%s'", target.ssid_profile_name)
+    return staged
+
+
+def stage_targets(targets: Iterable[Target], cfg: AppConfig | None = None) -> dict[str, dict]:
+    """
+    stage_next_psk() pro dávku targetů. Chybějící PSK se vygenerují najednou
+    (PskHistory.generate_bulk) – unikátní i v rámci dávky, i když targety
+    sdílejí SSID. Target, který stagovat nejde, se zaloguje a vynechá.
+    Vrací {target.key: staged}.
+    """
+    staged: dict[str, dict] = {}
+    missing: list[Target] = []
+    for target in targets:
+        current = load_staged(target)
+        if current:
+            staged[target.key] = current
+        else:
+            missing.append(target)
+
+    psks: dict[str, str] = {}
+    try:
+        history = get_history()
+        # staged z předchozího běhu procesu nesmí dostat jiný target
+        for current in staged.values():
+            history.reserve(current["psk"])
+        if missing:
+            psks = history.generate_bulk(
+                ((t.key, t.ssid_profile_name) for t in missing),
+                generate_psk,
+                (cfg or {}).get("PSK_REUSE_SCOPE", "global"),
             )
-        location_id = int(cfg["WM_LOCATION_ID"])
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("PSK history unavailable, reuse check skipped: %s", e)
+
+    for target in missing:
+        try:
+            staged[target.key] = stage_next_psk(target, cfg, psks.get(target.key))
+        except Exception as e:
+            logger.error("Cannot stage next PSK for '%s': %s", target.ssid_profile_name, e)
+    return staged
+
+
+# ---------------------------------------------------------------------------
+# Notifikace po rotaci (viz notify.py)
+# ---------------------------------------------------------------------------
+
 
-        # VERIFY_SSL (default True)
-        verify_ssl = bool(cfg.get("VERIFY_SSL", True))
-        if not verify_ssl:
-            urllib3.disable_warnings(InsecureRequestWarning)
+def notify_rotated(cfg: AppConfig, target: Target, ssid: str, psk: str):
+    """
+    Zařadí webhooky pro NOTIFY_WEBHOOKS do outboxu; doručení běží na pozadí
+    a rotaci nezdržuje.
+    """
+    from datetime import datetime, timezone
+
+    body = {
+        "event": "psk_rotated",
+        "ssid": ssid,
+        "psk": psk,
+        "profile_name": target.ssid_profile_name,
+        "location_id": target.location_id,
+        "node_id": target.node_id,
+        "wm_base_url": target.base_url,
+        "rotated_utc": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        notify.notify_rotation(cfg, body)
+    except Exception as e:
+        logger.error("Cannot queue notifications for '%s': %s", ssid, e)
+
+
+# ---------------------------------------------------------------------------
+# ROTATE
+# ---------------------------------------------------------------------------
+
+
+def open_wm_session(cfg: AppConfig, base_url: str) -> requests.Session:
+    """
+    Nová přihlášená session na WM (VERIFY_SSL + credentials z configu).
+    """
+    # VERIFY_SSL (default True)
+    if not cfg.verify_ssl:
+        urllib3.disable_warnings(InsecureRequestWarning)
+        logger.warning(
+            "VERIFY_SSL is set to false – TLS certs will NOT be verified!"
+        )
+
+    for attempt in (1, 2):
+        # credentials (username/password) z CREDENTIAL_PROVIDER, cachované per base URL
+        username, password = get_credentials(base_url, cfg)
+        logger.debug("Got WM_KEY_ID/WM_KEY_VALUE for %s (used as username/password)", base_url)
+
+        session = wm_metrics.instrument(requests.Session())
+        session.verify = cfg.verify_ssl
+        try:
+            login_to_wm(
+                session,
+                base_url,
+                username,
+                password,
+                cfg.get("WM_SESSION_VERSION", "latest"),
+            )
+            return session
+        except WmApiError as e:
+            session.close()
+            if attempt == 2 or not 400 <= e.status_code < 500:
+                raise
+            # secret mohl být mezitím změněn – zahodit cache a zkusit jednou znovu
             logger.warning(
-                "VERIFY_SSL is set to false – TLS certs will NOT be verified!"
+                "WM login to %s rejected (%s), reloading credentials and retrying",
+                base_url,
+                e.status_code,
             )
+            get_provider(cfg).invalidate(base_url)
+        except Exception:
+            session.close()
+            raise
 
-        # credentials z registry (username/password)
-        username, password = get_credentials_from_registry()
-        logger.debug("Got WM_KEY_ID/WM_KEY_VALUE from registry (used as username/password)")
 
-        new_psk = generate_psk()
-        logger.info("Generated new PSK passphrase: %s", new_psk)
+def close_wm_session(session: requests.Session, base_url: str, cfg: AppConfig):
+    try:
+        logout_from_wm(session, base_url, cfg.get("WM_SESSION_VERSION", "latest"))
+    except Exception:
+        # nechceme přepsat původní chybu
+        pass
+    session.close()
 
-        session = requests.Session()
-        session.verify = verify_ssl
 
-        # přihlášení
-        login_to_wm(
-            session,
-            base_url,
-            username,
-            password,
-            cfg.get("WM_SESSION_VERSION", "latest"),
-        )
+class WmSessionPool:
+    """
+    Přihlášené WM session per vlákno a base_url (bulk rotace, plan mode).
+    Každý worker se na daný WM přihlásí jen jednou; close() všechny odhlásí.
+    """
+
+    def __init__(self, cfg: AppConfig):
+        self.cfg = cfg
+        self._local = threading.local()
+        self._all: list[tuple[requests.Session, str]] = []
+        self._lock = threading.Lock()
+
+    def get(self, base_url: str) -> requests.Session:
+        sessions = getattr(self._local, "sessions", None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+
+        session = sessions.get(base_url)
+        if session is None:
+            session = open_wm_session(self.cfg, base_url)
+            sessions[base_url] = session
+            with self._lock:
+                self._all.append((session, base_url))
+        return session
+
+    def drop(self, base_url: str):
+        # po chybě zahodit session – příští target se přihlásí znovu
+        sessions = getattr(self._local, "sessions", {})
+        session = sessions.pop(base_url, None)
+        if session is not None:
+            close_wm_session(session, base_url, self.cfg)
+            with self._lock:
+                self._all = [(s, u) for s, u in self._all if s is not session]
+
+    def close(self):
+        with self._lock:
+            for session, base_url in self._all:
+                close_wm_session(session, base_url, self.cfg)
+            self._all.clear()
+
+
+def match_profiles(profiles: list, ssid_name: str) -> list[dict]:
+    return [
+        p
+        for p in profiles
+        if p.get("templateName") == ssid_name or p.get("ssid") == ssid_name
+    ]
+
 
+def find_profile(profiles: list, ssid_name: str) -> dict | None:
+    # při více shodách se bere první (viz plan mode – hlásí je jako ambiguous)
+    matches = match_profiles(profiles, ssid_name)
+    return matches[0] if matches else None
+
+
+@dataclass
+class PreparedRotation:
+    """
+    Vše, co jde udělat před plánovaným časem: přihlášená session,
+    načtený profil a předpřipravené PSK + QR. Cutover je pak jen PUT + publish.
+    """
+
+    cfg: AppConfig
+    target: Target
+    session: requests.Session
+    profile: dict
+    staged: dict
+    # session předaná zvenku (bulk) se nezavírá
+    owns_session: bool = True
+    # záznam v rotation outboxu (rotation_outbox.py), pokud je zapnutý
+    intent_id: int | None = None
+
+    def close(self):
+        if self.owns_session:
+            close_wm_session(self.session, self.target.base_url, self.cfg)
+
+
+def prepare_rotation(
+    cfg: AppConfig | None = None,
+    target: Target | None = None,
+    session: requests.Session | None = None,
+    staged: dict | None = None,
+) -> PreparedRotation:
+    cfg = cfg or load_config()
+    if target is None:
+        if not cfg.targets:
+            raise RuntimeError("No rotation target configured (SSID_PROFILE_NAME / TARGETS)")
+        target = cfg.targets[0]
+
+    staged = staged or stage_next_psk(target, cfg)
+    logger.info("Using staged PSK passphrase: %s", staged["psk"])
+
+    owns_session = session is None
+    if owns_session:
+        session = open_wm_session(cfg, target.base_url)
+
+    try:
         # načíst profily
         profiles = fetch_ssid_profiles(
             session,
-            base_url,
-            location_id,
-            node_id,
+            target.base_url,
+            target.location_id,
+            target.node_id,
             cfg.get("WM_DEVICECONFIG_VERSION", "17"),
         )
 
-        profile = next(
-            (
-                p
-                for p in profiles
-                if p.get("templateName") == ssid_name or p.get("ssid") == ssid_name
-            ),
-            None,
-        )
+        profile = find_profile(profiles, target.ssid_profile_name)
         if not profile:
             raise RuntimeError(
-                f"SSID profile '{ssid_name}' not found "
-                f"(location_id={location_id}, node_id={node_id})"
+                f"SSID profile '{target.ssid_profile_name}' not found "
+                f"(location_id={target.location_id}, node_id={target.node_id})"
+            )
+    except Exception:
+        if owns_session:
+            close_wm_session(session, target.base_url, cfg)
+        raise
+
+    return PreparedRotation(cfg, target, session, profile, staged, owns_session)
+
+
+def _refetch_profile(prepared: PreparedRotation) -> dict | None:
+    target = prepared.target
+    profiles = fetch_ssid_profiles(
+        prepared.session,
+        target.base_url,
+        target.location_id,
+        target.node_id,
+        prepared.cfg.get("WM_DEVICECONFIG_VERSION", "17"),
+    )
+    profile_id = prepared.profile.get("id")
+    for p in profiles:
+        if profile_id is not None and p.get("id") == profile_id:
+            return p
+    return find_profile(profiles, target.ssid_profile_name)
+
+
+# kontrola záměru + PUT jednoho targetu (plánovaná rotace i z rotation
+# outboxu) nesmí běžet souběžně; ověření a publish už zámek nedrží
+_commit_locks: dict[str, threading.Lock] = {}
+_commit_locks_guard = threading.Lock()
+
+
+def _commit_lock(target: Target) -> threading.Lock:
+    with _commit_locks_guard:
+        return _commit_locks.setdefault(target.key, threading.Lock())
+
+
+def commit_rotation(prepared: PreparedRotation) -> bool:
+    """
+    Cutover: PUT nového PSK, volitelně ověření, že ho WM převzal
+    (VERIFY_CONVERGENCE), a atomický publish stavu pro web UI.
+    Session z prepare_rotation() se vždy uzavře.
+    """
+    target = prepared.target
+    try:
+        cfg = prepared.cfg
+        new_psk = prepared.staged["psk"]
+
+        with _commit_lock(target):
+            if prepared.intent_id is None:
+                prepared.intent_id = rotation_outbox.record_intent(cfg, target, new_psk)
+            elif not rotation_outbox.intent_pending(prepared.intent_id):
+                logger.info("Queued rotation of '%s' superseded, skipping", target.ssid_profile_name)
+                return False
+
+            update_profile_psk(prepared.profile, new_psk)
+            version = cfg.get("WM_DEVICECONFIG_VERSION", "17")
+            put_profile(
+                prepared.session,
+                target.base_url,
+                build_put_payload(
+                    prepared.profile,
+                    version,
+                    bool(cfg.get("WM_MINIMAL_PUT", False)),
+                    cfg.get("WM_PUT_FIELDS"),
+                ),
+                version,
             )
 
-        update_profile_psk(profile, new_psk)
-        put_profile(session, base_url, profile, cfg.get("WM_DEVICECONFIG_VERSION", "17"))
+        verify = ConvergenceSettings.from_config(cfg)
+        if verify is not None:
+            # publikovat až ve chvíli, kdy WM nové PSK opravdu drží; při timeoutu
+            # zůstane PSK ve stagingu a příští pokus pošle stejné
+            wait_for_psk(
+                target.key,
+                lambda: _refetch_profile(prepared),
+                new_psk,
+                verify,
+            )
 
-        ssid = profile.get("ssid", ssid_name)
-        save_state(ssid, new_psk)
+        if not rotation_outbox.intent_pending(prepared.intent_id):
+            # mezitím proběhl PUT novějšího záměru – publikuje ho ta rotace
+            logger.info("Rotation of '%s' superseded after PUT, not publishing", target.ssid_profile_name)
+            return False
 
-        logger.info("PSK rotation SUCCESS: %s", new_psk)
+        ssid = prepared.profile.get("ssid", target.ssid_profile_name)
+        if target.publish:
+            state = save_state(ssid, new_psk, prepared.staged)
+            try:
+                push_state(cfg, state, DATA_DIR / state["qr_image"])
+            except Exception as e:
+                # rotace na WM už proběhla – chyba replikace ji nesmí shodit
+                logger.error("State replication failed: %s", e)
+            try:
+                export_from_config(cfg, state, DATA_DIR / state["qr_image"])
+            except Exception as e:
+                logger.error("Static page export failed: %s", e)
+        clear_staged(target, prepared.staged)
+        record_psk_history(ssid, new_psk, target)
+        notify_rotated(cfg, target, ssid, new_psk)
+        rotation_outbox.complete_intent(prepared.intent_id, target)
+
+        logger.info("PSK rotation SUCCESS: %s (%s)", new_psk, target.ssid_profile_name)
         return True
 
     except Exception as e:
-        logger.exception("PSK rotation FAILED: %s", e)
+        logger.exception("PSK rotation FAILED (%s): %s", target.ssid_profile_name, e)
+        rotation_outbox.fail_intent(prepared.cfg, prepared.intent_id, str(e), is_transient_error(e))
         return False
     finally:
-        if session is not None:
-            try:
-                logout_from_wm(
-                    session,
-                    base_url,  # type: ignore[name-defined]
-                    cfg.get("WM_SESSION_VERSION", "latest"),  # type: ignore[name-defined]
-                )
-            except Exception:
-                # nechceme přepsat původní chybu
-                pass
-            session.close()
+        prepared.close()
+
+
+def rotate_target(
+    target: Target,
+    cfg: AppConfig | None = None,
+    session: requests.Session | None = None,
+) -> bool:
+    cfg = cfg or load_config()
+    intent_id = None
+    try:
+        logger.info("Starting PSK rotation of '%s'...", target.ssid_profile_name)
+        staged = stage_next_psk(target, cfg)
+        # záměr se zapíše ještě před přihlášením – i nedostupný WM je pak ve frontě
+        intent_id = rotation_outbox.record_intent(cfg, target, staged["psk"])
+        prepared = prepare_rotation(cfg, target, session, staged)
+    except Exception as e:
+        logger.exception("PSK rotation FAILED (%s): %s", target.ssid_profile_name, e)
+        rotation_outbox.fail_intent(cfg, intent_id, str(e), is_transient_error(e))
+        return False
+
+    prepared.intent_id = intent_id
+    return commit_rotation(prepared)
+
+
+def replay_rotation(target: Target, psk: str, intent_id: int) -> bool:
+    """
+    Rotace z rotation outboxu – stejné PSK jako při původním pokusu.
+    """
+    cfg = load_config()
+    staged = load_staged(target)
+    if not staged or staged.get("psk") != psk:
+        staged = {"target": target.key, "ssid": _guess_display_ssid(target), "psk": psk, "qr_file": None}
+
+    try:
+        logger.info("Retrying queued PSK rotation of '%s'...", target.ssid_profile_name)
+        prepared = prepare_rotation(cfg, target, staged=staged)
+    except Exception as e:
+        logger.error("Queued PSK rotation FAILED (%s): %s", target.ssid_profile_name, e)
+        rotation_outbox.fail_intent(cfg, intent_id, str(e), is_transient_error(e))
+        return False
+
+    prepared.intent_id = intent_id
+    return commit_rotation(prepared)
+
+
+def prepare_all(
+    cfg: AppConfig | None = None,
+    targets: Iterable[Target] | None = None,
+) -> dict[str, PreparedRotation]:
+    """
+    prepare_rotation() pro všechny targety z configu (nebo jen pro zadané),
+    paralelně v poolu ROTATION_WORKERS. Target, který se připravit nepodaří,
+    se při cutoveru zkusí znovu celý.
+    """
+    cfg = cfg or load_config()
+    targets = list(cfg.targets if targets is None else targets)
+    if not targets:
+        return {}
+    staged = stage_targets(targets, cfg)
+
+    def prepare(target: Target) -> PreparedRotation | None:
+        try:
+            return prepare_rotation(cfg, target, staged=staged.get(target.key))
+        except Exception as e:
+            logger.error("Pre-staging of '%s' failed: %s", target.ssid_profile_name, e)
+            return None
 
+    workers = max(1, min(len(targets), int(cfg.get("ROTATION_WORKERS", 8))))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prepare") as pool:
+        prepared = dict(zip((t.key for t in targets), pool.map(prepare, targets)))
+    return {key: p for key, p in prepared.items() if p is not None}
 
-def main():
-    if not rotate_once():
+
+def prestage_targets(cfg: AppConfig, targets: Iterable[Target]) -> list[Target]:
+    """
+    Targety, pro které má smysl předem otevřít session (prepare_all). S ROLLOUT
+    jen první vlna – další vlny se přihlásí až těsně před svým spuštěním,
+    jinak by session čekaly nečinně a WM by dostal všechny loginy naráz.
+    """
+    targets = list(targets)
+    settings = RolloutSettings.from_config(cfg)
+    if settings is None or len(targets) <= 1:
+        return targets
+    waves = plan_waves(targets, settings)
+    return waves[0] if waves else []
+
+
+def rotate_targets(
+    cfg: AppConfig,
+    targets: Iterable[Target],
+    prepared: dict[str, PreparedRotation] | None = None,
+    wait: Callable[[float], bool] | None = None,
+    claim: Callable[[Target], bool] | None = None,
+) -> dict[str, bool]:
+    """
+    Zrotuje zadané targety (předpřipravené přes commit, ostatní celé).
+    S ROLLOUT v configu po vlnách (rollout.py), jinak všechny naráz
+    v poolu ROTATION_WORKERS (default 8) – čekání na konvergenci jednoho
+    targetu nezdrží PUT ostatních. claim(target)
+    se volá těsně před rotací targetu (obnova lease) – False = přeskočit.
+    Nepoužité prepared session se zavřou. Vrací {target.key: ok}.
+    """
+    started = time.time()
+    targets = list(targets)
+    prepared = dict(prepared or {})
+    prepared_lock = threading.Lock()
+
+    def rotate_one(target: Target) -> bool:
+        with prepared_lock:
+            p = prepared.pop(target.key, None)
+        if claim is not None and not claim(target):
+            if p:
+                p.close()
+            return False
+        return commit_rotation(p) if p else rotate_target(target, cfg)
+
+    settings = RolloutSettings.from_config(cfg)
+    if settings is not None and len(targets) > 1:
+        results = run_rollout(targets, rotate_one, settings, wait)
+    else:
+        workers = max(1, min(len(targets), int(cfg.get("ROTATION_WORKERS", 8))))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rotate") as pool:
+            results = dict(zip((t.key for t in targets), pool.map(rotate_one, targets)))
+
+    # targety odebrané z configu / přidělené jinému nodu mezi prepare a cutoverem,
+    # případně z vln, které rollout nespustil
+    for p in prepared.values():
+        p.close()
+
+    save_last_rotation(results, started, cfg)
+    wm_metrics.log_summary(reset=True)
+    return results
+
+
+def save_last_rotation(results: dict[str, bool], started: float, cfg: AppConfig | None = None):
+    """
+    Výsledek posledního běhu pro /readyz ve status_serveru (lokálně
+    i na REPLICA_NODES).
+    """
+    from datetime import datetime, timezone
+
+    failed = [key for key, ok in results.items() if not ok]
+    last_rotation = {
+        "ok": not failed,
+        "finished_utc": datetime.now(timezone.utc).isoformat(),
+        "seconds": round(time.time() - started, 3),
+        "targets": len(results),
+        "failed": failed,
+    }
+    try:
+        _write_json_atomic(LAST_ROTATION_FILE, last_rotation)
+    except OSError as e:
+        logger.warning("Cannot write %s: %s", LAST_ROTATION_FILE, e)
+
+    if cfg is not None:
+        try:
+            push_last_rotation(cfg, last_rotation)
+        except Exception as e:
+            logger.error("Last rotation replication failed: %s", e)
+
+
+def rotate_once(
+    prepared: dict[str, PreparedRotation] | None = None,
+    wait: Callable[[float], bool] | None = None,
+) -> bool:
+    try:
+        logger.info("Starting PSK rotation...")
+        cfg = load_config()
+        if not cfg.targets:
+            raise RuntimeError("No rotation target configured (SSID_PROFILE_NAME / TARGETS)")
+    except Exception as e:
+        logger.exception("PSK rotation FAILED: %s", e)
+        for p in (prepared or {}).values():
+            p.close()
+        return False
+
+    return all(rotate_targets(cfg, cfg.targets, prepared, wait).values())
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Arista WiFi PSK rotator")
+    parser.add_argument("--bulk", type=Path, help="CSV / JSONL file with targets to rotate")
+    parser.add_argument("--checkpoint", type=Path, help="checkpoint file for --bulk (resume)")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel rotations for --bulk")
+    parser.add_argument(
+        "--drain",
+        action="store_true",
+        help="retry rotations queued in the rotation outbox (ROTATION_OUTBOX) and exit",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="dry run: resolve SSID profiles for all targets (or --bulk file), change nothing",
+    )
+    args = parser.parse_args(argv)
+
+    if args.plan:
+        import plan
+
+        if not plan.main(args.bulk, args.concurrency):
+            sys.exit(1)
+        return
+
+    if args.drain:
+        pushed = replication.get_retrier().retry_due()
+        if pushed:
+            logger.info("Queued state pushes: %s/%s delivered", sum(pushed.values()), len(pushed))
+        drainer = rotation_outbox.get_drainer(load_config(), replay_rotation)
+        if drainer is None:
+            if pushed:
+                sys.exit(0 if all(pushed.values()) else 1)
+            sys.exit("ROTATION_OUTBOX is not enabled in config.json")
+        stats = drainer.drain()
+        logger.info("Rotation outbox drained: %(ok)s ok, %(failed)s failed, %(pending)s pending", stats)
+        wm_metrics.log_summary()
+        notify.shutdown(float(load_config().get("NOTIFY_FLUSH_SECONDS", 10)))
+        if stats["failed"]:
+            sys.exit(1)
+        return
+
+    if args.bulk:
+        from bulk_rotate import run_bulk
+
+        stats = run_bulk(args.bulk, args.checkpoint, args.concurrency)
+        wm_metrics.log_summary()
+        notify.shutdown(float(load_config().get("NOTIFY_FLUSH_SECONDS", 10)))
+        if stats["failed"]:
+            sys.exit(1)
+        return
+
+    ok = rotate_once()
+
+    # jednorázový běh – dát notifikacím chvíli na doručení, zbytek zůstane v outboxu
+    notify.shutdown(float(load_config().get("NOTIFY_FLUSH_SECONDS", 10)))
+
+    if not ok:
         sys.exit(1)
 
 
@@ -0,0 +1,263 @@
+"""
+Trvalá fronta zamýšlených rotací pro výpadky WM (queue "rotation" v outbox.py).
+
+Před přihlášením / PUT se každá rotace zapíše do outboxu (target + nové PSK,
+počet pokusů). Úspěch záznam smaže; když WM neodpovídá, záznam zůstane
+a dispatcher na pozadí (RotationDrainer) rotaci zopakuje s tím samým PSK –
+bez čekání na další plánovaný termín.
+
+- na target je v outboxu vždy nejvýš jeden čekající záznam (novější záměr
+  starší nahradí)
+- záznamy se zpracovávají od nejstaršího, paralelně nejvýš CONCURRENCY
+- opakuje se jen po přechodné chybě (WM nedostupný, timeout, 5xx / 429,
+  nepřevzaté PSK); chybějící profil, 4xx apod. jdou rovnou do "dead"
+- backoff 2, 4, 8 … s (max MAX_BACKOFF_SECONDS); jakmile se rotace na daný
+  WM povede, ostatní čekající targety téhož WM se naplánují hned
+- záměr platí MAX_AGE_SECONDS (default interval plánu, tj. do dalšího
+  plánovaného termínu, který stejně vygeneruje nové PSK) – pak zůstane
+  ve stavu "dead"
+
+config.json:
+  "ROTATION_OUTBOX": {"CONCURRENCY": 8, "MAX_BACKOFF_SECONDS": 60,
+                      "MAX_AGE_SECONDS": 3600}
+"""
+
+import dataclasses
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+from app_config import Target
+from outbox import Outbox, get_outbox
+
+QUEUE = "rotation"
+
+# záznam běžící rotace je pro dispatcher "neviditelný" – převezme ho, jen
+# když rotace selže (mark_retry) nebo proces během ní spadne
+IN_FLIGHT_SECONDS = 600
+
+logger = logging.getLogger("psk_rotation_outbox")
+
+
+@dataclass(frozen=True)
+class RotationOutboxSettings:
+    concurrency: int = 8
+    max_backoff_seconds: float = 60.0
+    # None = interval plánu (AppConfig.schedule_interval)
+    max_age_seconds: float | None = None
+
+    @classmethod
+    def from_config(cls, cfg) -> "RotationOutboxSettings | None":
+        raw = cfg.get("ROTATION_OUTBOX")
+        if not raw:
+            return None
+        if raw is True:
+            return cls()
+        return cls(
+            concurrency=max(1, int(raw.get("CONCURRENCY", cls.concurrency))),
+            max_backoff_seconds=max(1.0, float(raw.get("MAX_BACKOFF_SECONDS", cls.max_backoff_seconds))),
+            max_age_seconds=max(1.0, float(raw["MAX_AGE_SECONDS"])) if raw.get("MAX_AGE_SECONDS") else None,
+        )
+
+    def max_age(self, cfg) -> float:
+        if self.max_age_seconds is not None:
+            return self.max_age_seconds
+        return cfg.schedule_interval.total_seconds()
+
+
+# ---------------------------------------------------------------------------
+# API pro rotate_psk
+# ---------------------------------------------------------------------------
+
+
+def record_intent(cfg, target: Target, psk: str) -> int | None:
+    """
+    Zapíše zamýšlenou rotaci. Vrací id záznamu (None, pokud je outbox vypnutý).
+    """
+    settings = RotationOutboxSettings.from_config(cfg)
+    if settings is None:
+        return None
+    payload = {
+        "target": dataclasses.asdict(target),
+        "psk": psk,
+        "expires_at": time.time() + settings.max_age(cfg),
+    }
+    return get_outbox().enqueue(
+        QUEUE, target.key, payload, delay_seconds=IN_FLIGHT_SECONDS, supersede=True
+    )
+
+
+def intent_pending(intent_id: int | None) -> bool:
+    """
+    False, pokud záznam mezitím nahradil novější záměr (nebo je hotový).
+    """
+    if intent_id is None:
+        return True
+    item = get_outbox().get(intent_id)
+    return item is not None and item["status"] == "pending"
+
+
+def complete_intent(intent_id: int | None, target: Target):
+    if intent_id is None:
+        return
+    outbox = get_outbox()
+    outbox.mark_done(intent_id)
+    # WM zase odpovídá → targety, které na něm čekají na retry, hned na řadu
+    woken = outbox.reschedule(QUEUE, target.base_url + "|")
+    if woken:
+        logger.info("WM %s reachable again, %s queued rotation(s) rescheduled", target.base_url, woken)
+        if _drainer is not None:
+            _drainer.wake()
+
+
+def _expired(item: dict, at: float | None = None) -> bool:
+    expires_at = item["payload"].get("expires_at")
+    return expires_at is not None and (time.time() if at is None else at) >= expires_at
+
+
+def fail_intent(cfg, intent_id: int | None, error: str, retry: bool = True):
+    """
+    retry=False (trvalá chyba, viz rotate_psk.is_transient_error) záznam
+    rovnou ukončí; jinak se naplánuje další pokus, pokud ještě neprošvihne
+    platnost záměru.
+    """
+    if intent_id is None:
+        return
+    settings = RotationOutboxSettings.from_config(cfg) or RotationOutboxSettings()
+    outbox = get_outbox()
+    item = outbox.get(intent_id)
+    if item is None or item["status"] != "pending":
+        return
+
+    attempts = item["attempts"] + 1
+    if not retry:
+        outbox.mark_dead(intent_id, error)
+        logger.error("Queued rotation of '%s' dropped, error is not retryable: %s", item["key"], error)
+        return
+
+    delay = min(settings.max_backoff_seconds, 2 ** attempts)
+    if _expired(item, time.time() + delay):
+        outbox.mark_dead(intent_id, error)
+        logger.error("Queued rotation of '%s' expired after %s attempts: %s", item["key"], attempts, error)
+        return
+
+    outbox.mark_retry(intent_id, error, delay)
+    logger.warning("Rotation of '%s' queued for retry in %ss (attempt %s)", item["key"], delay, attempts)
+    if _drainer is not None:
+        _drainer.wake()
+
+
+# ---------------------------------------------------------------------------
+# Dispatcher
+# ---------------------------------------------------------------------------
+
+
+Replay = Callable[[Target, str, int], bool]
+
+
+class RotationDrainer:
+    """
+    Opakuje rotace z outboxu. replay(target, psk, intent_id) provede rotaci
+    (rotate_psk.replay_rotation) a sám záznam dokončí / naplánuje znovu.
+    """
+
+    def __init__(self, outbox: Outbox, replay: Replay, settings: RotationOutboxSettings):
+        self.outbox = outbox
+        self.replay = replay
+        self.settings = settings
+
+        self._pool = ThreadPoolExecutor(max_workers=settings.concurrency, thread_name_prefix="rotation-drain")
+        self._busy: set[str] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="rotation-drainer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.submit_due()
+            except Exception as e:
+                logger.error("Cannot read rotation outbox: %s", e)
+            self._wake.wait(1.0)
+            self._wake.clear()
+        self._pool.shutdown(wait=True)
+
+    def submit_due(self) -> list:
+        """
+        Předá poolu všechny záznamy, které jsou na řadě (nejstarší první).
+        """
+        futures = []
+        for row in self.outbox.due(QUEUE, self.settings.concurrency * 4, heads_only=True):
+            with self._lock:
+                if row["key"] in self._busy:
+                    continue
+                self._busy.add(row["key"])
+            futures.append(self._pool.submit(self._run, row))
+        return futures
+
+    def _run(self, row: dict) -> bool:
+        try:
+            if _expired(row):
+                self.outbox.mark_dead(row["id"], "expired")
+                logger.error("Queued rotation of '%s' expired, dropped", row["key"])
+                return False
+            target = Target(**row["payload"]["target"])
+            return self.replay(target, row["payload"]["psk"], row["id"])
+        except Exception as e:
+            logger.exception("Queued rotation of '%s' failed: %s", row["key"], e)
+            return False
+        finally:
+            with self._lock:
+                self._busy.discard(row["key"])
+            self._wake.set()
+
+    def drain(self) -> dict:
+        """
+        Jednorázově zpracuje vše, co je teď na řadě (CLI --drain).
+        """
+        ok = failed = 0
+        while True:
+            futures = self.submit_due()
+            if not futures:
+                break
+            for fut in futures:
+                if fut.result():
+                    ok += 1
+                else:
+                    failed += 1
+            if failed:
+                # zbytek čeká na backoff – nepokoušet znovu v tomtéž běhu
+                break
+        return {"ok": ok, "failed": failed, "pending": self.outbox.pending_count(QUEUE)}
+
+
+_drainer: RotationDrainer | None = None
+_drainer_lock = threading.Lock()
+
+
+def get_drainer(cfg, replay: Replay) -> RotationDrainer | None:
+    global _drainer
+    settings = RotationOutboxSettings.from_config(cfg)
+    if settings is None:
+        return None
+    with _drainer_lock:
+        if _drainer is None:
+            _drainer = RotationDrainer(get_outbox(), replay, settings)
+        return _drainer
@@ -0,0 +1,112 @@
+"""
+Statický export Wi-Fi karty – stránka se po každé rotaci vyrenderuje do
+adresáře, který může servírovat libovolný statický server, reverzní proxy
+cache nebo CDN. Pro čistě zobrazovací nasazení pak status_server.py
+není potřeba.
+
+- index.html = HTML_TEMPLATE z web_template.py (stejný vzhled jako Flask)
+- QR jako hashovaný soubor qr-<sha256>.png (neměnný, lze cachovat napořád),
+  nebo s INLINE_QR přímo v HTML jako data: URI
+- výměna je atomická: nejdřív se zapíše nový QR, pak index.html přes
+  tmp + os.replace; klient nikdy nedostane rozepsanou stránku ani odkaz
+  na neexistující obrázek
+
+config.json:
+  "STATIC_EXPORT": {"DIR": "C:\\\\inetpub\\\\wifi", "INLINE_QR": false}
+
+Ruční přegenerování z aktuálního data/current_psk.json:
+  py -3.12 static_export.py
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import sys
+from pathlib import Path
+
+from jinja2 import Environment
+
+from app_config import get_config, write_atomic
+from web_template import HTML_TEMPLATE, format_last_rotated
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+STATE_FILE = DATA_DIR / "current_psk.json"
+
+# starší QR se nechávají chvíli žít – klient mohl načíst předchozí index.html
+KEEP_OLD_ASSETS = 2
+
+logger = logging.getLogger("psk_static_export")
+
+_template = Environment(autoescape=True).from_string(HTML_TEMPLATE)
+
+
+def _prune_assets(export_dir: Path, keep: str):
+    assets = sorted(
+        (p for p in export_dir.glob("qr-*.png") if p.name != keep),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in assets[KEEP_OLD_ASSETS:]:
+        old.unlink(missing_ok=True)
+
+
+def export_site(state: dict, qr_path: Path, export_dir: Path, inline_qr: bool = False) -> Path:
+    """
+    Vyrenderuje stránku pro daný stav do export_dir. Vrací cestu k index.html.
+    """
+    export_dir = Path(export_dir)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    qr_png = Path(qr_path).read_bytes()
+
+    if inline_qr:
+        qr_src = "data:image/png;base64," + base64.b64encode(qr_png).decode("ascii")
+        asset = None
+    else:
+        asset = f"qr-{hashlib.sha256(qr_png).hexdigest()[:16]}.png"
+        if not (export_dir / asset).is_file():
+            write_atomic(export_dir / asset, qr_png)
+        qr_src = asset
+
+    html = _template.render(
+        error=None,
+        ssid=state.get("ssid"),
+        psk=state.get("psk"),
+        qr_src=qr_src,
+        last_rotated=format_last_rotated(state.get("last_rotated_utc")),
+    )
+    index = export_dir / "index.html"
+    write_atomic(index, html.encode("utf-8"))
+
+    if asset:
+        _prune_assets(export_dir, asset)
+    return index
+
+
+def export_from_config(cfg, state: dict, qr_path: Path) -> Path | None:
+    """
+    Export podle STATIC_EXPORT v configu (None, pokud je vypnutý).
+    """
+    settings = cfg.get("STATIC_EXPORT")
+    if not settings or not settings.get("DIR"):
+        return None
+    index = export_site(state, qr_path, Path(settings["DIR"]), bool(settings.get("INLINE_QR", False)))
+    logger.info("Static page exported to %s", index)
+    return index
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    try:
+        with STATE_FILE.open("r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        sys.exit(f"{STATE_FILE} does not exist yet – run a rotation first")
+
+    if export_from_config(get_config(), state, DATA_DIR / state["qr_image"]) is None:
+        sys.exit("STATIC_EXPORT.DIR is not set in config.json")
+
+
+if __name__ == "__main__":
+    main()
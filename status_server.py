@@ -1,10 +1,24 @@
+import base64
 import json
 import logging
 import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
-from flask import Flask, send_from_directory, render_template_string, abort
+from flask import Flask, send_from_directory, render_template_string, abort, jsonify, request
+
+import replication
+from app_config import (
+    DEFAULT_BACKEND_PORT,
+    apply_log_level,
+    get_config,
+    on_change,
+    start_watching,
+    write_atomic,
+)
+from web_template import HTML_TEMPLATE, format_last_rotated
 
 # === Paths ===
 BASE_DIR = Path(__file__).resolve().parent
@@ -21,22 +35,13 @@ LOG_FILE = LOGS_DIR / "web.log"
 # ---------------------------------------------------------------------------
 
 def _get_log_level_from_config(default: int = logging.INFO) -> int:
-    config_path = BASE_DIR / "config.json"
+    # strict=False – chybné TARGETS / plán rotátoru web neshodí (port,
+    # LOG_LEVEL i REPLICATION_SECRET platí dál)
     try:
-        with config_path.open("r", encoding="utf-8") as f:
-            cfg = json.load(f)
+        return get_config(strict=False).log_level
     except Exception:
         return default
 
-    level_name = str(cfg.get("LOG_LEVEL", "")).upper()
-    return {
-        "DEBUG": logging.DEBUG,
-        "INFO": logging.INFO,
-        "WARNING": logging.WARNING,
-        "ERROR": logging.ERROR,
-        "CRITICAL": logging.CRITICAL,
-    }.get(level_name, default)
-
 
 LOG_LEVEL = _get_log_level_from_config()
 
@@ -58,144 +63,7 @@ werkzeug_logger.setLevel(logging.WARNING)
 # === Flask app ===
 app = Flask(__name__)
 
-HTML_TEMPLATE = """
-<!doctype html>
-<html lang="en">
-<head>
-  <meta charset="utf-8">
-  <title>WiFi Access</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <meta http-equiv="refresh" content="30">
-  <style>
-    :root {
-      --bg: #e5e7eb;
-      --card-bg: #ffffff;
-      --accent: #4f46e5;
-      --accent-soft: #eef2ff;
-      --text-main: #111827;
-      --text-muted: #6b7280;
-      --text-soft: #9ca3af;
-    }
-
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, "Segoe UI", sans-serif;
-      background: radial-gradient(circle at top, #e5edff 0, #e5e7eb 45%, #e5e7eb 100%);
-      display: flex;
-      align-items: center;
-      justify-content: center;
-      min-height: 100vh;
-    }
-
-    .card {
-      background: var(--card-bg);
-      padding: 56px 64px;
-      border-radius: 32px;
-      box-shadow: 0 35px 80px rgba(15, 23, 42, 0.25);
-      text-align: center;
-      max-width: 720px;
-      width: 100%;
-    }
-
-    h1 {
-      margin-bottom: 8px;
-      font-size: 36px;
-      font-weight: 700;
-    }
-
-    p.subtitle {
-      margin-bottom: 40px;
-      font-size: 18px;
-      color: var(--text-muted);
-    }
-
-    .label {
-      text-transform: uppercase;
-      letter-spacing: .16em;
-      font-size: 12px;
-      color: var(--text-soft);
-      margin-bottom: 6px;
-    }
-
-    .value {
-      font-size: 22px;
-      font-weight: 600;
-      margin-bottom: 24px;
-    }
-
-    .psk-badge {
-      display: inline-block;
-      padding: 14px 28px;
-      border-radius: 999px;
-      background: var(--accent-soft);
-      font-family: "JetBrains Mono", monospace;
-      font-size: 24px;
-      margin-bottom: 32px;
-      border: 1px solid #e5e7eb;
-      user-select: all;
-    }
-
-    .qr img {
-      width: 340px;
-      height: 340px;
-      border-radius: 24px;
-      box-shadow: 0 30px 60px rgba(15, 23, 42, 0.22);
-    }
-
-    .footer {
-      font-size: 12px;
-      color: var(--text-soft);
-      margin-top: 10px;
-    }
-
-    .error {
-      color: #b91c1c;
-      font-size: 16px;
-    }
-
-    @media (max-width: 768px) {
-      .card {
-        padding: 32px 24px;
-        margin: 24px;
-      }
-      .qr img {
-        width: 260px;
-        height: 260px;
-      }
-    }
-  </style>
-</head>
-
-<body>
-<div class="card">
-  {% if error %}
-    <h1>WiFi Access</h1>
-    <p class="subtitle">Scan the QR code or type the password</p>
-    <p class="error">{{ error }}</p>
-  {% else %}
-    <h1>WiFi Access</h1>
-    <p class="subtitle">Scan the QR code or type the password</p>
-
-    <div class="label">SSID</div>
-    <div class="value">{{ ssid }}</div>
-
-    <div class="label">Password</div>
-    <div class="psk-badge">{{ psk }}</div>
-
-    <div class="qr">
-      <img src="/qr/{{ qr_image }}" alt="WiFi QR">
-    </div>
-
-    {% if last_rotated %}
-      <div class="footer">
-        Last rotated: {{ last_rotated }}
-      </div>
-    {% endif %}
-  {% endif %}
-</div>
-</body>
-</html>
-"""
+_ingest_lock = threading.Lock()
 
 
 # ---------------------------------------------------------------------------
@@ -230,29 +98,31 @@ def index():
     psk = state.get("psk")
     qr_image = state.get("qr_image")
 
-    # Convert ISO timestamp
-    last_rotated_raw = state.get("last_rotated_utc")
-    last_rotated = None
-
-    if last_rotated_raw:
-        try:
-            dt = datetime.fromisoformat(last_rotated_raw)
-            last_rotated = dt.strftime("%Y-%m-%d %H:%M:%S UTC")
-        except Exception:
-            last_rotated = last_rotated_raw
-
     return render_template_string(
         HTML_TEMPLATE,
         error=None,
         ssid=ssid,
         psk=psk,
-        qr_image=qr_image,
-        last_rotated=last_rotated,
+        qr_src=f"/qr/{qr_image}",
+        last_rotated=format_last_rotated(state.get("last_rotated_utc")),
+    )
+
+
+def _is_qr_name(filename: str) -> bool:
+    # jen QR obrázky z data/ – žádné cesty, JSON, klíče ani databáze
+    return (
+        Path(filename).name == filename
+        and filename.startswith("wifi_qr_")
+        and filename.endswith(".png")
     )
 
 
 @app.route("/qr/<path:filename>")
 def qr(filename: str):
+    if not _is_qr_name(filename):
+        logger.warning("Refused non-QR file request: %s", filename)
+        abort(404)
+
     file_path = DATA_DIR / filename
     if not file_path.is_file():
         logger.warning("QR file not found: %s", file_path)
@@ -261,22 +131,202 @@ def qr(filename: str):
     return send_from_directory(DATA_DIR, filename)
 
 
-def load_config_port() -> int:
-    config_path = BASE_DIR / "config.json"
+# ---------------------------------------------------------------------------
+# Ingest replikovaného stavu z rotátoru (viz replication.py)
+# ---------------------------------------------------------------------------
+
+@app.route("/api/ingest", methods=["POST"])
+def ingest():
+    try:
+        secret = replication.get_secret(get_config(strict=False))
+    except Exception:
+        secret = replication.get_secret(None)
+    if not secret:
+        abort(404)
+
+    body = request.get_data()
+    if not replication.verify(
+        secret,
+        request.headers.get(replication.TIMESTAMP_HEADER),
+        request.headers.get(replication.SIGNATURE_HEADER),
+        body,
+    ):
+        logger.warning("Rejected state push from %s: bad signature", request.remote_addr)
+        abort(401)
+
+    try:
+        payload = json.loads(body)
+        if "last_rotation" in payload:
+            return _ingest_last_rotation(payload["last_rotation"])
+        state = payload["state"]
+        version = int(state["version"])
+        qr_image = str(state["qr_image"])
+        qr_png = base64.b64decode(payload["qr_png_b64"], validate=True)
+    except Exception as e:
+        logger.warning("Rejected state push: invalid payload: %s", e)
+        abort(400)
+
+    # jen holé jméno QR souboru v data/ – stejné pravidlo jako /qr
+    if not _is_qr_name(qr_image):
+        abort(400)
+
+    with _ingest_lock:
+        current = load_state() or {}
+        if int(current.get("version") or 0) >= version:
+            return jsonify({"status": "stale", "version": current.get("version")}), 409
+
+        # nejdřív QR, pak JSON – stejně jako rotate_psk.save_state()
+        write_atomic(DATA_DIR / qr_image, qr_png)
+        write_atomic(DATA_DIR / "current_psk.json", json.dumps(state, indent=2).encode("utf-8"))
+
+    refresh_health()
+    logger.info("Ingested replicated state v%s (SSID %s)", version, state.get("ssid"))
+    return jsonify({"status": "ok", "version": version})
+
+
+def _ingest_last_rotation(last_rotation: dict):
+    # výsledek posledního běhu rotace pro /readyz – jen novější než uložený
+    finished = datetime.fromisoformat(str(last_rotation["finished_utc"]))
+    with _ingest_lock:
+        current = _read_json(DATA_DIR / "last_rotation.json") or {}
+        try:
+            if current and datetime.fromisoformat(current["finished_utc"]) >= finished:
+                return jsonify({"status": "stale"}), 409
+        except (KeyError, TypeError, ValueError):
+            pass
+        write_atomic(
+            DATA_DIR / "last_rotation.json",
+            json.dumps(last_rotation, indent=2).encode("utf-8"),
+        )
+
+    refresh_health()
+    logger.info("Ingested last rotation result (%s)", "ok" if last_rotation.get("ok") else "failed")
+    return jsonify({"status": "ok"})
+
+
+# ---------------------------------------------------------------------------
+# Health / readiness pro load balancer a monitoring
+# ---------------------------------------------------------------------------
+#
+# /readyz se odpovídá z předpočítaného snapshotu v paměti (bez čtení disku
+# a renderování šablony); snapshot obnovuje vlákno na pozadí každé
+# HEALTH_REFRESH_SECONDS a hned po ingestu replikovaného stavu.
+
+HEALTH_REFRESH_SECONDS = 2.0
+DEFAULT_READY_GRACE_SECONDS = 1800
+
+_health: dict | None = None
+_health_thread: threading.Thread | None = None
 
-    if not config_path.is_file():
-        return 8081
 
+def _read_json(path: Path) -> dict | None:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug("Cannot read %s: %s", path, e)
+        return None
+
+
+def refresh_health():
+    global _health
+    state = _read_json(DATA_DIR / "current_psk.json") or {}
+
+    rotated_at = None
+    if state.get("last_rotated_utc"):
+        try:
+            rotated_at = datetime.fromisoformat(state["last_rotated_utc"]).timestamp()
+        except ValueError:
+            pass
+
+    try:
+        cfg = get_config(strict=False)
+        max_age = cfg.schedule_interval.total_seconds() + float(
+            cfg.get("READY_GRACE_SECONDS", DEFAULT_READY_GRACE_SECONDS)
+        )
+        strict = bool(cfg.get("READY_STRICT", False))
+    except Exception:
+        max_age = 86400 + DEFAULT_READY_GRACE_SECONDS
+        strict = False
+
+    # jeden nový dict místo úprav na místě – request vždy vidí konzistentní snapshot
+    _health = {
+        "ssid": state.get("ssid"),
+        "version": state.get("version"),
+        "last_rotated_utc": state.get("last_rotated_utc"),
+        "rotated_at": rotated_at,
+        "max_age_seconds": max_age,
+        "strict": strict,
+        "last_rotation": _read_json(DATA_DIR / "last_rotation.json"),
+    }
+
+
+def start_health_refresh(interval: float = HEALTH_REFRESH_SECONDS):
+    global _health_thread
+    if _health_thread is not None and _health_thread.is_alive():
+        return
+
+    def loop():
+        while True:
+            try:
+                refresh_health()
+            except Exception as e:
+                logger.error("Health refresh failed: %s", e)
+            time.sleep(interval)
+
+    refresh_health()
+    _health_thread = threading.Thread(target=loop, name="health-refresh", daemon=True)
+    _health_thread.start()
+
+
+@app.route("/healthz")
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz")
+def readyz():
+    # stale stav je jen příznak (200) – jedna neúspěšná rotace nesmí vyřadit
+    # všechny web nody z load balanceru; 503 jen s READY_STRICT
+    health = _health
+    if health is None:
+        refresh_health()
+        health = _health
+
+    if health["rotated_at"] is None:
+        age = None
+        stale = True
+    else:
+        age = round(time.time() - health["rotated_at"], 1)
+        stale = age > health["max_age_seconds"]
+
+    body = {
+        "status": "stale" if stale else "ready",
+        "stale": stale,
+        "ssid": health["ssid"],
+        "version": health["version"],
+        "last_rotated_utc": health["last_rotated_utc"],
+        "state_age_seconds": age,
+        "max_age_seconds": health["max_age_seconds"],
+        "last_rotation": health["last_rotation"],
+    }
+    return jsonify(body), 503 if stale and health["strict"] else 200
+
+
+def load_config_port() -> int:
     try:
-        with config_path.open("r", encoding="utf-8") as f:
-            cfg = json.load(f)
-        return int(cfg.get("BACKEND_PORT", 8081))
+        return get_config(strict=False).backend_port
     except Exception:
-        return 8081
+        return DEFAULT_BACKEND_PORT
 
 
 def main():
     port = load_config_port()
+    on_change(apply_log_level, strict=False)
+    start_watching()
+    start_health_refresh()
     logger.info("Starting Flask web on port %s", port)
     app.run(host="0.0.0.0", port=port)
 
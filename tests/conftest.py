@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# moduly rotátoru leží v kořeni repozitáře
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
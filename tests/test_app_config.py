@@ -0,0 +1,125 @@
+"""
+Načítání config.json (app_config.py) – chyby targetů / plánu se týkají jen
+rotátoru, web server z configu dál čte port, LOG_LEVEL a REPLICATION_SECRET.
+Atomický zápis souborů (write_atomic / open_atomic).
+"""
+
+import json
+import logging
+import threading
+
+import pytest
+
+import app_config
+from app_config import ConfigError, get_config, open_atomic, parse_config, write_atomic
+
+VALID = {
+    "BACKEND_PORT": 9000,
+    "LOG_LEVEL": "DEBUG",
+    "REPLICATION_SECRET": "s3",
+    "SSID_PROFILE_NAME": "GUEST",
+    "WM_LOCATION_ID": 1,
+    "WM_BASE_URL": "https://wm.local",
+}
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(app_config, "CONFIG_PATH", path)
+    monkeypatch.setattr(app_config, "_cached", None)
+    monkeypatch.setattr(app_config, "_latest", None)
+    monkeypatch.setattr(app_config, "_cached_stamp", None)
+    monkeypatch.setattr(app_config, "_callbacks", [])
+
+    def write(data: dict):
+        path.write_text(json.dumps(data), encoding="utf-8")
+        app_config._last_check = 0.0
+
+    return write
+
+
+@pytest.mark.parametrize(
+    "broken",
+    [
+        {"WM_LOCATION_ID": None},
+        {"ROTATION_HOUR": 24},
+        {"TARGETS": [{"SSID_PROFILE_NAME": "A"}, {"SSID_PROFILE_NAME": "A"}]},
+    ],
+)
+def test_rotator_errors_are_recorded_when_not_strict(broken):
+    data = {**VALID, **broken}
+
+    with pytest.raises(ConfigError):
+        parse_config(data)
+
+    cfg = parse_config(data, strict=False)
+    assert cfg.errors
+    assert cfg.backend_port == 9000
+    assert cfg.log_level == logging.DEBUG
+    assert cfg["REPLICATION_SECRET"] == "s3"
+
+
+def test_web_reads_port_from_config_invalid_for_rotation(config_file):
+    config_file({**VALID, "WM_LOCATION_ID": None})
+
+    assert get_config(strict=False).backend_port == 9000
+    with pytest.raises(ConfigError):
+        get_config()
+
+
+def test_invalid_reload_keeps_previous_config_for_rotator_only(config_file):
+    config_file(VALID)
+    assert get_config().targets
+
+    seen = {True: [], False: []}
+    app_config.on_change(lambda cfg: seen[True].append(cfg))
+    app_config.on_change(lambda cfg: seen[False].append(cfg), strict=False)
+
+    config_file({**VALID, "BACKEND_PORT": 9001, "ROTATION_HOUR": 24})
+    web = get_config(strict=False)
+    rotator = get_config()
+
+    assert web.backend_port == 9001 and web.errors
+    assert rotator.backend_port == 9000 and not rotator.errors
+    assert seen[True] == [] and seen[False] == [web]
+
+
+# ---------------------------------------------------------------------------
+# Atomický zápis
+# ---------------------------------------------------------------------------
+
+
+def test_concurrent_writers_do_not_collide(tmp_path):
+    path = tmp_path / "current_psk.json"
+    errors = []
+
+    def writer(i: int):
+        try:
+            for _ in range(50):
+                write_atomic(path, json.dumps({"writer": i, "pad": "x" * 1000 * i}))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert json.loads(path.read_text(encoding="utf-8"))["writer"] in range(8)
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = tmp_path / "index.html"
+    write_atomic(path, "old")
+
+    with pytest.raises(RuntimeError):
+        with open_atomic(path) as f:
+            f.write(b"half")
+            raise RuntimeError("render failed")
+
+    assert path.read_text(encoding="utf-8") == "old"
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
@@ -0,0 +1,255 @@
+"""
+Koordinace dvou nodů nad sdíleným lease úložištěm (leader.py).
+"""
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from app_config import Target
+from leader import (
+    Coordinator,
+    DirectoryLeaseStore,
+    LeaseStore,
+    SqliteLeaseStore,
+    next_interval_slot,
+    schedule_cycle,
+)
+
+TARGETS = [Target(f"SSID_{i}", i, 0, "https://wm.local") for i in range(12)]
+
+
+@pytest.fixture(params=["sqlite", "directory"])
+def store_factory(request, tmp_path):
+    # každý node má vlastní instanci úložiště nad stejnými daty, jako na dvou strojích
+    if request.param == "sqlite":
+        return lambda: SqliteLeaseStore(tmp_path / "leases.sqlite")
+    return lambda: DirectoryLeaseStore(tmp_path / "leases")
+
+
+def _nodes(store_factory, ttl: float = 60.0) -> tuple[Coordinator, Coordinator]:
+    a = Coordinator(store_factory(), "node-a", ttl)
+    b = Coordinator(store_factory(), "node-b", ttl)
+    a.heartbeat()
+    b.heartbeat()
+    return a, b
+
+
+def _fast_wait(seconds: float) -> bool:
+    time.sleep(min(seconds, 0.05))
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Termíny
+# ---------------------------------------------------------------------------
+
+
+def test_interval_slot_is_same_for_nodes_started_at_different_times():
+    interval = timedelta(minutes=15)
+    started_a = datetime(2025, 3, 1, 10, 1, 7)
+    started_b = datetime(2025, 3, 1, 10, 13, 59)
+
+    run_a = next_interval_slot(interval, started_a)
+    run_b = next_interval_slot(interval, started_b)
+
+    assert run_a == run_b > started_b
+    assert schedule_cycle("interval", interval, run_a) == schedule_cycle("interval", interval, run_b)
+
+
+def test_interval_cycle_changes_every_slot():
+    interval = timedelta(minutes=15)
+    first = next_interval_slot(interval, datetime(2025, 3, 1, 10, 1))
+    second = next_interval_slot(interval, first)
+
+    assert second - first == interval
+    assert schedule_cycle("interval", interval, first) != schedule_cycle("interval", interval, second)
+
+
+def test_daily_cycle_is_date_and_time():
+    assert schedule_cycle("daily", (2, 0), datetime(2025, 3, 1, 2, 0)) == "2025-03-01T02:00"
+
+
+# ---------------------------------------------------------------------------
+# Lease
+# ---------------------------------------------------------------------------
+
+
+def test_targets_are_split_between_live_nodes(store_factory):
+    a, b = _nodes(store_factory)
+
+    mine_a = {t.key for t in a.owned_targets(TARGETS)}
+    mine_b = {t.key for t in b.owned_targets(TARGETS)}
+
+    assert mine_a and mine_b
+    assert mine_a.isdisjoint(mine_b)
+    assert mine_a | mine_b == {t.key for t in TARGETS}
+
+
+def test_lease_is_exclusive_until_released(store_factory):
+    a, b = _nodes(store_factory)
+    target = TARGETS[0]
+
+    assert a.acquire(target)
+    assert not b.acquire(target)
+    # vlastní lease lze obnovit
+    assert a.acquire(target)
+
+    a.release(target)
+    assert b.acquire(target)
+    assert not a.acquire(target)
+
+
+def test_lease_expires_after_ttl(store_factory):
+    a, b = _nodes(store_factory, ttl=0.3)
+    target = TARGETS[0]
+
+    assert a.acquire(target)
+    assert not b.acquire(target)
+    time.sleep(0.4)
+    assert b.acquire(target)
+
+
+def test_dead_node_drops_out_of_assignment(store_factory):
+    a, b = _nodes(store_factory, ttl=0.3)
+    time.sleep(0.4)
+    a.heartbeat()  # b se přestal hlásit
+
+    assert {t.key for t in a.owned_targets(TARGETS)} == {t.key for t in TARGETS}
+
+
+# ---------------------------------------------------------------------------
+# Cyklus rotace
+# ---------------------------------------------------------------------------
+
+
+def test_two_nodes_rotate_each_target_once_per_cycle(store_factory):
+    a, b = _nodes(store_factory)
+    rotated = Counter()
+    lock = threading.Lock()
+
+    def rotate(node: str):
+        def run(targets):
+            with lock:
+                rotated.update((t.key, node) for t in targets)
+            return {t.key: True for t in targets}
+
+        return run
+
+    results = {}
+
+    def run_node(coordinator: Coordinator):
+        results[coordinator.node_id] = coordinator.run_cycle(
+            "cycle-1", TARGETS, rotate(coordinator.node_id), _fast_wait, max_wait=2
+        )
+
+    threads = [threading.Thread(target=run_node, args=(c,)) for c in (a, b)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    per_target = Counter(key for key, _node in rotated.elements())
+    assert per_target == Counter({t.key: 1 for t in TARGETS})
+    assert set(results["node-a"]).isdisjoint(results["node-b"])
+
+    # opakované spuštění téhož cyklu (restart služby) už nic nerotuje
+    again = a.run_cycle("cycle-1", TARGETS, rotate("node-a"), _fast_wait, max_wait=0.5)
+    assert again == {}
+
+
+def test_surviving_node_takes_over_targets_of_dead_node(store_factory):
+    a, b = _nodes(store_factory, ttl=0.4)
+    rotated = []
+
+    def rotate(targets):
+        rotated.extend(t.key for t in targets)
+        return {t.key: True for t in targets}
+
+    def wait(seconds: float) -> bool:
+        a.heartbeat()  # a žije, b (spadlý) se už nehlásí
+        return _fast_wait(seconds)
+
+    results = a.run_cycle("cycle-1", TARGETS, rotate, wait, max_wait=5)
+
+    assert sorted(rotated) == sorted(t.key for t in TARGETS)
+    assert all(results.values())
+
+
+def test_cycle_wait_is_bounded_by_max_wait(store_factory):
+    a, b = _nodes(store_factory, ttl=60)
+    mine = {t.key for t in a.owned_targets(TARGETS)}
+
+    started = time.monotonic()
+    results = a.run_cycle(
+        "cycle-1", TARGETS, lambda ts: {t.key: True for t in ts}, _fast_wait, max_wait=0.3
+    )
+
+    # targety živého nodu b zůstanou jemu, a na ně nečeká celé 2× TTL
+    assert time.monotonic() - started < 5
+    assert set(results) == mine
+
+
+def test_failed_rotation_releases_lease_for_retry(store_factory):
+    a, b = _nodes(store_factory)
+    target = next(t for t in TARGETS if a.owned_targets([t]))
+
+    results = a.run_cycle("cycle-1", [target], lambda ts: {t.key: False for t in ts}, _fast_wait, max_wait=0)
+
+    assert results == {target.key: False}
+    assert b.acquire(target)
+
+
+def test_store_errors_do_not_end_the_cycle(store_factory):
+    a, b = _nodes(store_factory)
+    mine = {t.key for t in a.owned_targets(TARGETS)}
+    store = a.store
+    failures = {"live_nodes": 1, "done_cycle": 1, "complete": 1}
+
+    def flaky(name):
+        method = getattr(store, name)
+
+        def call(*args):
+            if failures[name]:
+                failures[name] -= 1
+                raise OSError(f"share unavailable ({name})")
+            return method(*args)
+
+        return call
+
+    for name in failures:
+        setattr(store, name, flaky(name))
+
+    results = a.run_cycle(
+        "cycle-1", TARGETS, lambda ts: {t.key: True for t in ts}, _fast_wait, max_wait=1
+    )
+
+    # po výpadku úložiště se targety zrotují v dalším kole, nic nepropadne ven
+    assert set(results) == mine
+    assert all(results.values())
+    assert not any(failures.values())
+
+
+def test_incomplete_store_cannot_be_instantiated():
+    class NoDoneCycle(LeaseStore):
+        # done_cycle chybí
+        def heartbeat(self, node_id, ttl):
+            pass
+
+        def live_nodes(self):
+            return []
+
+        def try_acquire(self, key, owner, ttl):
+            return True
+
+        def release(self, key, owner):
+            pass
+
+        def complete(self, key, owner, cycle):
+            pass
+
+    with pytest.raises(TypeError):
+        NoDoneCycle()
@@ -0,0 +1,89 @@
+"""
+Minimální PUT payload (rotate_psk.build_put_payload) – PUT na WM profil
+nahrazuje celý, takže payload nesmí ztratit žádnou konfiguraci.
+"""
+
+import copy
+
+import pytest
+
+from rotate_psk import PUT_FIELD_ALLOWLIST, PUT_READONLY_FIELDS, build_put_payload
+
+VERSION = "17"
+
+PROFILE = {
+    "id": 1042,
+    "templateName": "GUEST",
+    "ssid": "GUEST",
+    "locationId": 1,
+    "nodeId": 4,
+    "enabled": True,
+    "wirelessProfile": {
+        "securityMode": {"type": "WPA2_PSK", "pskPassphrase": "new-passphrase"},
+        "band": "DUAL",
+        "vlanId": 100,
+        "broadcastSsid": True,
+    },
+    "createdBy": "admin@example.local",
+    "createdAt": "2024-01-01T00:00:00Z",
+    "modifiedBy": "psk-rotator",
+    "modifiedAt": "2024-01-01T00:00:00Z",
+    "revision": 7,
+    "inheritedFrom": {"locationId": 0},
+    "statistics": {"clients": 37},
+    "appliedDevices": [{"mac": "00:11:74:00:00:01"}],
+}
+
+
+def test_full_payload_is_the_profile():
+    assert build_put_payload(PROFILE, VERSION, minimal=False) is PROFILE
+
+
+def test_minimal_payload_keeps_every_configuration_key():
+    payload = build_put_payload(PROFILE, VERSION, minimal=True)
+
+    config = {k: v for k, v in PROFILE.items() if k not in PUT_READONLY_FIELDS[VERSION]}
+    assert payload == config
+    assert payload["wirelessProfile"] == PROFILE["wirelessProfile"]
+
+
+def test_minimal_payload_drops_only_known_readonly_keys():
+    payload = build_put_payload(PROFILE, VERSION, minimal=True)
+
+    dropped = set(PROFILE) - set(payload)
+    assert dropped == set(PUT_READONLY_FIELDS[VERSION])
+
+
+def test_allowlist_and_readonly_fields_do_not_overlap():
+    top_level = {f.split(".", 1)[0] for f in PUT_FIELD_ALLOWLIST[VERSION]}
+    assert top_level.isdisjoint(PUT_READONLY_FIELDS[VERSION])
+
+
+@pytest.mark.parametrize("extra", [{"captivePortal": {"enabled": False}}, {"radiusServers": []}])
+def test_unknown_keys_are_kept(extra):
+    profile = {**copy.deepcopy(PROFILE), **extra}
+
+    payload = build_put_payload(profile, VERSION, minimal=True)
+
+    for key, value in extra.items():
+        assert payload[key] == value
+
+
+def test_unknown_api_version_sends_full_profile():
+    assert build_put_payload(PROFILE, "99", minimal=True) is PROFILE
+
+
+def test_explicit_fields_are_used_exactly():
+    payload = build_put_payload(
+        PROFILE, VERSION, minimal=True, fields=["id", "wirelessProfile.securityMode"]
+    )
+
+    assert payload == {"id": 1042, "wirelessProfile": {"securityMode": PROFILE["wirelessProfile"]["securityMode"]}}
+
+
+def test_payload_does_not_modify_profile():
+    profile = copy.deepcopy(PROFILE)
+
+    build_put_payload(profile, VERSION, minimal=True)
+
+    assert profile == PROFILE
@@ -0,0 +1,197 @@
+"""
+Fronta rotací (rotation_outbox.py): nahrazení starších záměrů, drain,
+retry a expirace.
+"""
+
+import dataclasses
+import time
+from datetime import timedelta
+
+import pytest
+
+import rotation_outbox
+from app_config import Target
+from outbox import Outbox
+from rotation_outbox import QUEUE, RotationDrainer, RotationOutboxSettings
+
+TARGET = Target("SSID_1", 1, 0, "https://wm.local")
+OTHER = Target("SSID_2", 2, 0, "https://wm.local")
+
+
+class Cfg(dict):
+    schedule_interval = timedelta(hours=1)
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    box = Outbox(tmp_path / "outbox.sqlite")
+    monkeypatch.setattr(rotation_outbox, "get_outbox", lambda: box)
+    monkeypatch.setattr(rotation_outbox, "_drainer", None)
+    yield box
+    box.close()
+
+
+@pytest.fixture
+def cfg():
+    return Cfg(ROTATION_OUTBOX={"CONCURRENCY": 2})
+
+
+def _make_due(outbox: Outbox, intent_id: int):
+    # záznam běžící rotace je IN_FLIGHT_SECONDS neviditelný – simulovat
+    # neúspěšný pokus a uplynulý backoff
+    outbox.mark_retry(intent_id, "WM down", 0)
+
+
+def _drainer(outbox: Outbox, replay) -> RotationDrainer:
+    return RotationDrainer(outbox, replay, RotationOutboxSettings(concurrency=2))
+
+
+# ---------------------------------------------------------------------------
+# Záměry
+# ---------------------------------------------------------------------------
+
+
+def test_disabled_outbox_records_nothing(outbox):
+    assert rotation_outbox.record_intent(Cfg(), TARGET, "psk-1") is None
+    assert outbox.pending_count(QUEUE) == 0
+
+
+def test_newer_intent_supersedes_older(outbox, cfg):
+    first = rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+    second = rotation_outbox.record_intent(cfg, TARGET, "psk-2")
+
+    assert not rotation_outbox.intent_pending(first)
+    assert rotation_outbox.intent_pending(second)
+    assert outbox.pending_count(QUEUE) == 1
+    assert outbox.get(second)["payload"]["psk"] == "psk-2"
+
+
+def test_intents_of_other_targets_are_kept(outbox, cfg):
+    rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+    rotation_outbox.record_intent(cfg, OTHER, "psk-2")
+
+    assert outbox.pending_count(QUEUE) == 2
+
+
+def test_intent_expires_at_next_scheduled_slot(outbox, cfg):
+    before = time.time()
+    intent_id = rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+
+    expires_at = outbox.get(intent_id)["payload"]["expires_at"]
+    assert before + 3600 <= expires_at <= time.time() + 3600
+
+
+def test_completed_intent_wakes_other_targets_of_same_wm(outbox, cfg):
+    done = rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+    waiting = rotation_outbox.record_intent(cfg, OTHER, "psk-2")
+    outbox.mark_retry(waiting, "WM down", 300)
+
+    rotation_outbox.complete_intent(done, TARGET)
+
+    assert outbox.get(done) is None
+    assert [row["id"] for row in outbox.due(QUEUE)] == [waiting]
+
+
+# ---------------------------------------------------------------------------
+# Chyby
+# ---------------------------------------------------------------------------
+
+
+def test_transient_failure_is_retried_with_backoff(outbox, cfg):
+    intent_id = rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+
+    rotation_outbox.fail_intent(cfg, intent_id, "connection refused", retry=True)
+
+    item = outbox.get(intent_id)
+    assert item["status"] == "pending"
+    assert item["attempts"] == 1
+    assert item["next_attempt_at"] > time.time()
+
+
+def test_permanent_failure_is_dead_at_once(outbox, cfg):
+    intent_id = rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+
+    rotation_outbox.fail_intent(cfg, intent_id, "SSID profile not found", retry=False)
+
+    assert outbox.get(intent_id)["status"] == "dead"
+    assert outbox.pending_count(QUEUE) == 0
+
+
+def test_retry_past_expiry_is_dead(outbox):
+    cfg = Cfg(ROTATION_OUTBOX={"MAX_AGE_SECONDS": 1})
+    intent_id = rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+
+    # backoff 2 s by skončil až po platnosti záměru
+    rotation_outbox.fail_intent(cfg, intent_id, "connection refused", retry=True)
+
+    assert outbox.get(intent_id)["status"] == "dead"
+
+
+# ---------------------------------------------------------------------------
+# Drain
+# ---------------------------------------------------------------------------
+
+
+def test_drain_replays_due_intents_with_same_psk(outbox, cfg):
+    ids = [
+        rotation_outbox.record_intent(cfg, TARGET, "psk-1"),
+        rotation_outbox.record_intent(cfg, OTHER, "psk-2"),
+    ]
+    for intent_id in ids:
+        _make_due(outbox, intent_id)
+    replayed = []
+
+    def replay(target: Target, psk: str, intent_id: int) -> bool:
+        replayed.append((target, psk))
+        rotation_outbox.complete_intent(intent_id, target)
+        return True
+
+    stats = _drainer(outbox, replay).drain()
+
+    assert stats == {"ok": 2, "failed": 0, "pending": 0}
+    assert sorted(replayed, key=lambda r: r[1]) == [(TARGET, "psk-1"), (OTHER, "psk-2")]
+
+
+def test_drain_stops_after_failure(outbox, cfg):
+    intent_id = rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+    _make_due(outbox, intent_id)
+    calls = []
+
+    def replay(target: Target, psk: str, intent_id: int) -> bool:
+        calls.append(intent_id)
+        rotation_outbox.fail_intent(cfg, intent_id, "connection refused", retry=True)
+        return False
+
+    stats = _drainer(outbox, replay).drain()
+
+    # záznam čeká na backoff, v tomtéž běhu se znovu nezkouší
+    assert stats == {"ok": 0, "failed": 1, "pending": 1}
+    assert calls == [intent_id]
+
+
+def test_drain_skips_superseded_intent(outbox, cfg):
+    old = rotation_outbox.record_intent(cfg, TARGET, "psk-1")
+    _make_due(outbox, old)
+    new = rotation_outbox.record_intent(cfg, TARGET, "psk-2")
+
+    # nový záměr je v běhu (IN_FLIGHT), starý už ve frontě není
+    assert _drainer(outbox, lambda *a: pytest.fail("nothing is due")).drain() == {
+        "ok": 0,
+        "failed": 0,
+        "pending": 1,
+    }
+    assert not rotation_outbox.intent_pending(old)
+    assert rotation_outbox.intent_pending(new)
+
+
+def test_drain_drops_expired_intent(outbox):
+    intent_id = outbox.enqueue(
+        QUEUE,
+        TARGET.key,
+        {"target": dataclasses.asdict(TARGET), "psk": "psk-1", "expires_at": time.time() - 1},
+    )
+
+    stats = _drainer(outbox, lambda *a: pytest.fail("expired intent replayed")).drain()
+
+    assert stats["failed"] == 1
+    assert outbox.get(intent_id)["status"] == "dead"
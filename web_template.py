@@ -0,0 +1,159 @@
+"""
+Šablona stránky s Wi-Fi kartou – sdílí ji status_server.py (Flask)
+a static_export.py (statický export bez Pythonu na cestě requestu).
+
+Proměnné: error | ssid, psk, qr_src (URL obrázku s QR), last_rotated.
+"""
+
+from datetime import datetime
+
+HTML_TEMPLATE = """
+<!doctype html>
+<html lang="en">
+<head>
+  <meta charset="utf-8">
+  <title>WiFi Access</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  <meta http-equiv="refresh" content="30">
+  <style>
+    :root {
+      --bg: #e5e7eb;
+      --card-bg: #ffffff;
+      --accent: #4f46e5;
+      --accent-soft: #eef2ff;
+      --text-main: #111827;
+      --text-muted: #6b7280;
+      --text-soft: #9ca3af;
+    }
+
+    body {
+      margin: 0;
+      font-family: system-ui, -apple-system, "Segoe UI", sans-serif;
+      background: radial-gradient(circle at top, #e5edff 0, #e5e7eb 45%, #e5e7eb 100%);
+      display: flex;
+      align-items: center;
+      justify-content: center;
+      min-height: 100vh;
+    }
+
+    .card {
+      background: var(--card-bg);
+      padding: 56px 64px;
+      border-radius: 32px;
+      box-shadow: 0 35px 80px rgba(15, 23, 42, 0.25);
+      text-align: center;
+      max-width: 720px;
+      width: 100%;
+    }
+
+    h1 {
+      margin-bottom: 8px;
+      font-size: 36px;
+      font-weight: 700;
+    }
+
+    p.subtitle {
+      margin-bottom: 40px;
+      font-size: 18px;
+      color: var(--text-muted);
+    }
+
+    .label {
+      text-transform: uppercase;
+      letter-spacing: .16em;
+      font-size: 12px;
+      color: var(--text-soft);
+      margin-bottom: 6px;
+    }
+
+    .value {
+      font-size: 22px;
+      font-weight: 600;
+      margin-bottom: 24px;
+    }
+
+    .psk-badge {
+      display: inline-block;
+      padding: 14px 28px;
+      border-radius: 999px;
+      background: var(--accent-soft);
+      font-family: "JetBrains Mono", monospace;
+      font-size: 24px;
+      margin-bottom: 32px;
+      border: 1px solid #e5e7eb;
+      user-select: all;
+    }
+
+    .qr img {
+      width: 340px;
+      height: 340px;
+      border-radius: 24px;
+      box-shadow: 0 30px 60px rgba(15, 23, 42, 0.22);
+    }
+
+    .footer {
+      font-size: 12px;
+      color: var(--text-soft);
+      margin-top: 10px;
+    }
+
+    .error {
+      color: #b91c1c;
+      font-size: 16px;
+    }
+
+    @media (max-width: 768px) {
+      .card {
+        padding: 32px 24px;
+        margin: 24px;
+      }
+      .qr img {
+        width: 260px;
+        height: 260px;
+      }
+    }
+  </style>
+</head>
+
+<body>
+<div class="card">
+  {% if error %}
+    <h1>WiFi Access</h1>
+    <p class="subtitle">Scan the QR code or type the password</p>
+    <p class="error">{{ error }}</p>
+  {% else %}
+    <h1>WiFi Access</h1>
+    <p class="subtitle">Scan the QR code or type the password</p>
+
+    <div class="label">SSID</div>
+    <div class="value">{{ ssid }}</div>
+
+    <div class="label">Password</div>
+    <div class="psk-badge">{{ psk }}</div>
+
+    <div class="qr">
+      <img src="{{ qr_src }}" alt="WiFi QR">
+    </div>
+
+    {% if last_rotated %}
+      <div class="footer">
+        Last rotated: {{ last_rotated }}
+      </div>
+    {% endif %}
+  {% endif %}
+</div>
+</body>
+</html>
+"""
+
+
+def format_last_rotated(raw: str | None) -> str | None:
+    """
+    ISO timestamp ze stavu → "YYYY-mm-dd HH:MM:SS UTC".
+    """
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw).strftime("%Y-%m-%d %H:%M:%S UTC")
+    except Exception:
+        return raw
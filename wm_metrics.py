@@ -0,0 +1,106 @@
+"""
+Účtování provozu na WM API – počet requestů, bajty tam i zpět a latence,
+souhrnně per druh volání (např. "PUT ssidprofiles").
+
+Měří se přes response hook na requests.Session (instrument()), takže každé
+volání přes session z open_wm_session() se započítá bez úprav jednotlivých
+funkcí.
+"""
+
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger("psk_wm_metrics")
+
+_stats: dict[str, dict] = {}
+_lock = threading.RLock()
+
+
+def _endpoint(method: str, url: str) -> str:
+    # ".../wifi/api/deviceconfiguration/ssidprofiles?locationid=1" → "GET ssidprofiles"
+    path = urlsplit(url).path.rstrip("/")
+    return f"{method} {path.rsplit('/', 1)[-1] or '/'}"
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return 0
+
+
+def _record(resp: requests.Response, *args, **kwargs):
+    req = resp.request
+    sent = _body_size(req.body)
+    received = len(resp.content)
+    elapsed_ms = resp.elapsed.total_seconds() * 1000
+
+    with _lock:
+        s = _stats.setdefault(
+            _endpoint(req.method, req.url),
+            {"requests": 0, "bytes_sent": 0, "bytes_received": 0, "total_ms": 0.0, "max_ms": 0.0},
+        )
+        s["requests"] += 1
+        s["bytes_sent"] += sent
+        s["bytes_received"] += received
+        s["total_ms"] += elapsed_ms
+        s["max_ms"] = max(s["max_ms"], elapsed_ms)
+
+
+def instrument(session: requests.Session) -> requests.Session:
+    session.hooks.setdefault("response", []).append(_record)
+    return session
+
+
+def get_stats() -> dict[str, dict]:
+    """
+    {endpoint: {requests, bytes_sent, bytes_received, total_ms, avg_ms, max_ms}}
+    """
+    with _lock:
+        out = {}
+        for name, s in _stats.items():
+            out[name] = {
+                **s,
+                "total_ms": round(s["total_ms"], 1),
+                "avg_ms": round(s["total_ms"] / s["requests"], 1),
+                "max_ms": round(s["max_ms"], 1),
+            }
+        return out
+
+
+def totals(stats: dict[str, dict] | None = None) -> dict:
+    stats = get_stats() if stats is None else stats
+    return {
+        key: sum(s[key] for s in stats.values())
+        for key in ("requests", "bytes_sent", "bytes_received", "total_ms")
+    }
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def log_summary(reset: bool = False):
+    with _lock:
+        stats = get_stats()
+        if reset:
+            _stats.clear()
+    if not stats:
+        return
+    for name, s in sorted(stats.items()):
+        logger.info(
+            "WM %s: %s request(s), %s B sent, %s B received, avg %.1f ms, max %.1f ms",
+            name,
+            s["requests"],
+            s["bytes_sent"],
+            s["bytes_received"],
+            s["avg_ms"],
+            s["max_ms"],
+        )